@@ -0,0 +1,58 @@
+"""
+Manifest-backed cache for generated assets.
+
+Each cached output directory holds a manifest.json that records the cache key
+the images were produced with. A lookup only hits when the key matches and
+every file listed in the manifest is still on disk.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+import storage
+
+MANIFEST_NAME = "manifest.json"
+
+
+def hash_text(*parts: str) -> str:
+    """Stable sha256 over an ordered list of text parts"""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def load_manifest(directory: str | Path) -> dict | None:
+    path = Path(directory) / MANIFEST_NAME
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(directory: str | Path, manifest: dict) -> None:
+    data = json.dumps(manifest, indent=2).encode("utf-8")
+    storage.atomic_write_bytes(Path(directory) / MANIFEST_NAME, data)
+
+
+def lookup(directory: str | Path, key: str, files_field: str) -> dict | None:
+    """
+    Return the manifest in `directory` if it was written for `key` and all the
+    files listed under `files_field` still exist, otherwise None.
+    """
+    manifest = load_manifest(directory)
+    if not manifest or manifest.get("key") != key:
+        return None
+
+    files = manifest.get(files_field)
+    if not files:
+        return None
+    if isinstance(files, str):
+        files = [files]
+    if not all(Path(p).is_file() for p in files):
+        return None
+
+    return manifest
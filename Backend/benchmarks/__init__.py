@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Backend workflows.
+
+Run from the Backend directory, e.g.:
+    python -m benchmarks.orchestration
+"""
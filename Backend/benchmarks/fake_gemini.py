@@ -0,0 +1,158 @@
+"""
+Local stand-in for the parts of google.genai.Client the workflows use.
+
+It answers `models.generate_content` and `chats.create(...).send_message`
+with a generated PNG (or a short text for text models), so workflows can be
+timed without network or quota. PIL images in the request are PNG-encoded,
+as the real SDK does before sending, and every call's start and end time is
+kept in `call_log`.
+
+Latency is `latency` seconds, or lognormally spread around that median with
+`jitter` as sigma; `error_rate` of the calls fail with a retryable 503.
+"""
+
+import asyncio
+import io
+import random
+import threading
+import time
+
+from google.genai import types
+from PIL import Image
+
+
+def _png_bytes(size: tuple[int, int]) -> bytes:
+    # Noise compresses about as badly as a painted illustration, unlike a flat fill
+    channels = [Image.effect_noise(size, sigma) for sigma in (20, 40, 60)]
+    buf = io.BytesIO()
+    Image.merge("RGB", channels).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _serialize(contents) -> None:
+    for item in contents if isinstance(contents, list) else [contents]:
+        if isinstance(item, Image.Image):
+            item.save(io.BytesIO(), format="PNG")
+
+
+def _response(part: types.Part) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[part]))]
+    )
+
+
+def _image_response(data: bytes) -> types.GenerateContentResponse:
+    return _response(
+        types.Part(inline_data=types.Blob(data=data, mime_type="image/png"))
+    )
+
+
+def _is_text_model(model: str) -> bool:
+    return "image" not in model
+
+
+class FakeAPIError(Exception):
+    """Stands in for google.genai.errors.APIError; `code` is the HTTP status"""
+
+    def __init__(self, code: int = 503):
+        super().__init__(f"{code} fake backend error")
+        self.code = code
+
+
+class _Models:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        _serialize(contents)
+        return self._client._respond(text=_is_text_model(model))
+
+
+class _Chat:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    def send_message(self, message, config=None):
+        _serialize(message)
+        return self._client._respond()
+
+
+class _Chats:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    def create(self, model, config=None):
+        return _Chat(self._client)
+
+
+class _AsyncModels:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        _serialize(contents)
+        return await self._client._respond_async(text=_is_text_model(model))
+
+
+class _AsyncClient:
+    def __init__(self, client: "FakeGeminiClient"):
+        self.models = _AsyncModels(client)
+
+
+class FakeGeminiClient:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        image_size: tuple[int, int] = (64, 64),
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self.call_log: list[tuple[float, float]] = []
+        self._image = _png_bytes(image_size)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _Models(self)
+        self.chats = _Chats(self)
+        self.aio = _AsyncClient(self)
+
+    def _start(self) -> tuple[float, bool]:
+        """Count a call; returns its latency and whether it fails"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency
+            if delay and self.jitter:
+                delay *= self._random.lognormvariate(0.0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            self.errors += fail
+        return delay, fail
+
+    def _finish(
+        self, started: float, fail: bool, text: bool
+    ) -> types.GenerateContentResponse:
+        with self._lock:
+            self.call_log.append((started, time.perf_counter()))
+        if fail:
+            raise FakeAPIError()
+        if text:
+            return _response(types.Part(text="A fake but fitting pun?"))
+        return _image_response(self._image)
+
+    def _respond(self, text: bool = False) -> types.GenerateContentResponse:
+        delay, fail = self._start()
+        started = time.perf_counter()
+        if delay:
+            time.sleep(delay)
+        return self._finish(started, fail, text)
+
+    async def _respond_async(self, text: bool = False) -> types.GenerateContentResponse:
+        delay, fail = self._start()
+        started = time.perf_counter()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._finish(started, fail, text)
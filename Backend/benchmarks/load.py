@@ -0,0 +1,223 @@
+"""
+Throughput and latency of the server endpoints under increasing concurrency.
+
+server.py is driven in-process over ASGI with the demo_scenarios.SCENARIOS
+surveys, while Gemini is replaced by FakeGeminiClient with a configurable
+latency distribution, error rate and image size. For every concurrency
+level and endpoint it sends a batch of requests from that many concurrent
+clients and reports throughput and p50/p95/p99 latency:
+
+  landscape : POST /generate-landscape with a scenario's answers
+  generate  : GET /generate with one of the scenarios' categories
+  pun       : POST /generate-pun with a scenario description as theme
+
+Requests bypass the result cache (refresh=true). Identical requests in
+flight at the same time are still coalesced, as in production; use
+--distinct to make every request unique. Rate limits are the real per-model
+budgets unless --unlimited is given.
+
+Usage (from the Backend directory):
+    python -m benchmarks.load [--concurrency 1,4,16] [--requests 32]
+        [--latency 0.5] [--jitter 0.3] [--error-rate 0.02] [--size 512]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_gemini import FakeGeminiClient
+
+ENDPOINTS = ("landscape", "generate", "pun")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_request(endpoint: str, i: int, distinct: bool) -> dict:
+    """httpx request arguments for request number `i` of an endpoint"""
+    from demo_scenarios import SCENARIOS
+
+    scenarios = list(SCENARIOS.values())
+    scenario = scenarios[i % len(scenarios)]
+    suffix = f" {i}" if distinct else ""
+
+    if endpoint == "landscape":
+        answers = [dict(item) for item in scenario["data"]]
+        answers[0]["category"] += suffix
+        return {
+            "method": "POST",
+            "url": "/generate-landscape",
+            "params": {"refresh": "true"},
+            "json": answers,
+        }
+    if endpoint == "generate":
+        things = [item["category"] for s in scenarios for item in s["data"]]
+        return {
+            "method": "GET",
+            "url": "/generate",
+            "params": {"thing": things[i % len(things)] + suffix, "refresh": "true"},
+        }
+    return {
+        "method": "POST",
+        "url": "/generate-pun",
+        "json": {
+            "question": f"How are you feeling today?{suffix}",
+            "theme": scenario["description"],
+        },
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    concurrency: int,
+    count: int,
+    distinct: bool,
+    offset: int,
+) -> dict:
+    """Send `count` requests from `concurrency` clients; latencies and errors"""
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(count):
+        queue.put_nowait(offset + i)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            request = build_request(endpoint, queue.get_nowait(), distinct)
+            started = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "errors": errors, "seconds": elapsed}
+
+
+async def run(args) -> None:
+    # Imported here (as is demo_scenarios) so the scratch directory and rate
+    # limits are set up before the server modules read them
+    import gemini
+    import main
+    import server
+    import survey_landscape
+
+    fake = FakeGeminiClient(
+        latency=args.latency,
+        image_size=(args.size, args.size),
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    gemini.set_client(fake)
+    main.get_workflow()
+    survey_landscape.get_workflow()
+
+    transport = httpx.ASGITransport(app=server.app)
+    print(
+        f"{'endpoint':>9} {'conc':>5} {'reqs':>5} {'errors':>6} {'req/s':>7} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'coalesced':>9}"
+    )
+    offset = 0
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                count = max(args.requests, concurrency)
+                flights = {
+                    "landscape": survey_landscape.inflight,
+                    "generate": main.inflight,
+                }.get(endpoint)
+                coalesced = flights.stats()["coalesced"] if flights else 0
+
+                result = await run_level(
+                    client, endpoint, concurrency, count, args.distinct, offset
+                )
+                offset += count
+
+                if flights:
+                    coalesced = flights.stats()["coalesced"] - coalesced
+                ms = [v * 1000 for v in result["latencies"]]
+                print(
+                    f"{endpoint:>9} {concurrency:>5} {count:>5} {result['errors']:>6} "
+                    f"{count / result['seconds']:>7.2f} {percentile(ms, 50):>8.0f} "
+                    f"{percentile(ms, 95):>8.0f} {percentile(ms, 99):>8.0f} "
+                    f"{coalesced:>9}"
+                )
+
+    print(f"\nFake Gemini calls: {fake.calls}, injected errors: {fake.errors}")
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(c) for c in v.split(",")],
+        default=[1, 4, 16],
+        help="comma-separated concurrency levels",
+    )
+    parser.add_argument("--requests", type=int, default=32, help="per level")
+    parser.add_argument(
+        "--endpoints",
+        type=lambda v: v.split(","),
+        default=list(ENDPOINTS),
+        help=f"comma-separated subset of {','.join(ENDPOINTS)}",
+    )
+    parser.add_argument("--latency", type=float, default=0.5, help="median seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="lognormal sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--size", type=int, default=512, help="image side in px")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distinct", action="store_true")
+    parser.add_argument("--unlimited", action="store_true", help="no rate limits")
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    os.environ.setdefault("PRECOMPUTE", "0")
+    # The workflows log every stage; keep the report readable
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.unlimited:
+        unlimited = {"rpm": 1_000_000, "concurrency": 1_000}
+        os.environ["GEMINI_RATE_LIMITS"] = json.dumps(
+            {
+                model: unlimited
+                for model in (
+                    "gemini-2.5-flash-image",
+                    "gemini-3-pro-image-preview",
+                    "gemini-3-flash-preview",
+                )
+            }
+        )
+
+    # Outputs go to a scratch directory, never to the real assets/
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    os.chdir(workdir)
+    print(
+        f"latency {args.latency}s (sigma {args.jitter}), error rate "
+        f"{args.error_rate}, {args.size}px images (scratch dir {workdir})\n"
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    cli()
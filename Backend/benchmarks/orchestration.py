@@ -0,0 +1,134 @@
+"""
+Per-request orchestration overhead of the survey landscape workflow.
+
+Gemini is replaced by an instant local client, so the numbers are the cost
+of building/compiling the graph and walking it, not of image generation.
+Three variants are compared for surveys of 5, 50 and 500 items:
+
+  rebuild+loop  : compile a fresh graph per request, one superstep pair per item
+                  (the original behaviour)
+  cached+loop   : compiled graph reused, still one superstep pair per item
+  cached+batch  : compiled graph reused, all items in one node (current)
+
+Usage (from the Backend directory):
+    python -m benchmarks.orchestration [--repeat 20]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from langgraph.graph import StateGraph, END
+
+import gemini
+import survey_landscape as sl
+from benchmarks.fake_gemini import FakeGeminiClient
+
+SIZES = [5, 50, 500]
+
+
+# ---------------------------------------
+# Original per-item loop, kept here for comparison
+# ---------------------------------------
+def _loop_element(state):
+    item = state["survey_answers"][state["current_index"]]
+    state["element_prompts"].append(
+        sl.generate_element_prompt(item["category"], item["score"])
+    )
+    return state
+
+
+def _loop_increment(state):
+    state["current_index"] += 1
+    return state
+
+
+def _loop_check(state):
+    if state["error"]:
+        return "error"
+    if state["current_index"] >= len(state["survey_answers"]):
+        return "done_with_elements"
+    return "continue"
+
+
+def create_loop_workflow():
+    g = StateGraph(sl.LandscapeState)
+
+    g.add_node("initialize", sl.initialize_state)
+    g.add_node("generate_element", _loop_element)
+    g.add_node("increment", _loop_increment)
+    g.add_node("create_composite_prompt", sl.create_composite_prompt)
+    g.add_node("generate_final", sl.generate_final_landscape)
+    g.add_node("finalize", sl.finalize)
+
+    g.set_entry_point("initialize")
+    g.add_edge("initialize", "generate_element")
+    g.add_edge("generate_element", "increment")
+    g.add_conditional_edges(
+        "increment",
+        _loop_check,
+        {
+            "continue": "generate_element",
+            "done_with_elements": "create_composite_prompt",
+            "error": "finalize",
+        },
+    )
+    g.add_edge("create_composite_prompt", "generate_final")
+    g.add_edge("generate_final", "finalize")
+    g.add_edge("finalize", END)
+    return g.compile()
+
+
+# ---------------------------------------
+# Measurement
+# ---------------------------------------
+def make_survey(size: int) -> list[dict]:
+    return [{"category": f"element {i}", "score": i % 5 + 1} for i in range(size)]
+
+
+def time_requests(get_app, survey: list[dict], repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        app = get_app()
+        result = app.invoke(
+            sl.new_landscape_state(survey),
+            config={"recursion_limit": 10 * len(survey)},
+        )
+        timings.append(time.perf_counter() - started)
+        assert not result["error"], result["error"]
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    gemini.set_client(FakeGeminiClient())
+    cached_loop = create_loop_workflow()
+    variants = {
+        "rebuild+loop": create_loop_workflow,
+        "cached+loop": lambda: cached_loop,
+        "cached+batch": sl.get_workflow,
+    }
+
+    # Outputs go to a scratch directory, never to the real assets/
+    workdir = tempfile.mkdtemp(prefix="bench-orchestration-")
+    os.chdir(workdir)
+
+    print(f"Median ms per request over {args.repeat} runs (scratch dir {workdir})\n")
+    print(f"{'items':>6} " + " ".join(f"{name:>14}" for name in variants))
+    for size in SIZES:
+        survey = make_survey(size)
+        row = []
+        for get_app in variants.values():
+            timings = time_requests(get_app, survey, args.repeat)
+            row.append(statistics.median(timings) * 1000)
+        print(f"{size:>6} " + " ".join(f"{ms:>14.2f}" for ms in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Gap between receiving one stage's image and sending the next stage's request.
+
+Gemini is replaced by a local client returning a noisy image of the given
+size, so the gap is pure local work on the critical path:
+
+  disk      : save the PNG, publish it, create derivatives, then Image.open
+              it for the next stage (the original behaviour)
+  in-memory : hand the received bytes straight to the next stage and save
+              on the background writer (current)
+
+Usage (from the Backend directory):
+    python -m benchmarks.stage_handoff [--repeat 5] [--size 1024]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langgraph.graph import StateGraph, END
+from PIL import Image
+
+import gemini
+import main
+import rate_limit
+import storage
+from benchmarks.fake_gemini import FakeGeminiClient
+
+
+# ---------------------------------------
+# Original disk round trip, kept here for comparison
+# ---------------------------------------
+def _disk_generate_image(state, config=None):
+    stage = state["current_stage"]
+    prompt = main.STAGE_PROMPTS[stage].format(thing=state["thing"])
+    state["prompts"].append(prompt)
+
+    contents = [prompt]
+    if stage > 1:
+        contents.append(Image.open(state["image_paths"][-1]))
+
+    response = rate_limit.call(
+        main.IMAGE_MODEL,
+        gemini.get_client().models.generate_content,
+        model=main.IMAGE_MODEL,
+        contents=contents,
+    )
+
+    filename = f"{storage.safe_dirname(state['thing'])}_{stage}.png"
+    output_path = Path(state["output_dir"]) / filename
+    for part in response.candidates[0].content.parts:
+        if part.inline_data:
+            storage.save_image(part.as_image(), output_path)
+            storage.publish(output_path, Path(state["asset_dir"]) / filename)
+            state["image_paths"].append(str(output_path))
+            state["derivatives"].append(main.save_derivatives(output_path))
+            return state
+
+    state["error"] = "No image returned"
+    return state
+
+
+def create_workflow(generate_node):
+    g = StateGraph(main.AssetState)
+
+    g.add_node("initialize", main.initialize_state)
+    g.add_node("generate", generate_node)
+    g.add_node("increment", main.increment_stage)
+    g.add_node("finalize", main.finalize)
+
+    g.set_entry_point("initialize")
+    g.add_edge("initialize", "generate")
+    g.add_edge("generate", "increment")
+    g.add_conditional_edges(
+        "increment",
+        main.check_completion,
+        {"continue": "generate", "end": "finalize"},
+    )
+    g.add_edge("finalize", END)
+    return g.compile()
+
+
+# ---------------------------------------
+# Measurement
+# ---------------------------------------
+def run_progressions(app, client: FakeGeminiClient, repeat: int):
+    gaps, totals = [], []
+    for i in range(repeat):
+        client.call_log.clear()
+        started = time.perf_counter()
+        result = app.invoke(main.new_state(f"thing {i}"))
+        totals.append(time.perf_counter() - started)
+        assert not result["error"], result["error"]
+
+        calls = client.call_log
+        gaps += [nxt[0] - prev[1] for prev, nxt in zip(calls, calls[1:])]
+    return gaps, totals
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--size", type=int, default=1024, help="image side in px")
+    args = parser.parse_args()
+
+    client = FakeGeminiClient(image_size=(args.size, args.size))
+    gemini.set_client(client)
+    variants = {
+        "disk": create_workflow(_disk_generate_image),
+        "in-memory": main.get_workflow(),
+    }
+
+    # Outputs go to a scratch directory, never to the real assets/
+    workdir = tempfile.mkdtemp(prefix="bench-handoff-")
+    os.chdir(workdir)
+
+    print(
+        f"{args.size}px images, {args.repeat} progressions per variant "
+        f"(scratch dir {workdir})\n"
+    )
+    print(f"{'variant':>10} {'gap p50 ms':>11} {'gap max ms':>11} {'run ms':>9}")
+    for name, app in variants.items():
+        gaps, totals = run_progressions(app, client, args.repeat)
+        print(
+            f"{name:>10} {statistics.median(gaps) * 1000:>11.1f} "
+            f"{max(gaps) * 1000:>11.1f} {statistics.median(totals) * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,266 @@
+"""
+Record and replay Gemini responses, for offline and reproducible runs.
+
+CassetteClient wraps the shared client (see gemini.get_client) and stores
+every `models.generate_content`, `aio.models.generate_content` and
+`chats.create(...).send_message` response, image parts included, together
+with how long the call took. Responses live in
+{GEMINI_CASSETTE_DIR}/{model}/{key}.json, where the key hashes the model,
+the prompt text, the input images and the request config; earlier
+messages of the same chat are part of the key too.
+
+    GEMINI_CASSETTE=record   call Gemini and save every response
+    GEMINI_CASSETTE=replay   answer from the cassettes only, no network or
+                             API key needed; a missing response is an error
+    GEMINI_CASSETTE=auto     replay what is recorded, record the rest
+    GEMINI_CASSETTE_DIR      where cassettes live (default "cassettes")
+    GEMINI_CASSETTE_LATENCY  1 to replay with the recorded call durations
+
+Replayed calls still go through rate_limit; raise GEMINI_RATE_LIMITS for
+runs that should not wait on the production budgets.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any
+import storage
+
+MODE = os.getenv("GEMINI_CASSETTE", "")
+CASSETTE_DIR = Path(os.getenv("GEMINI_CASSETTE_DIR", "cassettes"))
+REPLAY_LATENCY = os.getenv("GEMINI_CASSETTE_LATENCY", "0") == "1"
+
+RECORD = "record"
+REPLAY = "replay"
+AUTO = "auto"
+MODES = (RECORD, REPLAY, AUTO)
+
+
+class CassetteMiss(LookupError):
+    """A replayed request was never recorded"""
+
+
+def _digest(parts: list[bytes]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def _config_json(config) -> bytes:
+    if config is None:
+        return b""
+    if hasattr(config, "model_dump"):
+        config = config.model_dump(mode="json", exclude_none=True)
+    return json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+
+
+def content_hashes(contents) -> tuple[str, str]:
+    """(prompt hash, input image hash) of a request's contents"""
+    texts, images = [], []
+    for item in contents if isinstance(contents, list) else [contents]:
+        if isinstance(item, str):
+            texts.append(item.encode("utf-8"))
+        elif getattr(item, "inline_data", None) is not None:
+            images.append(item.inline_data.data)
+        elif getattr(item, "text", None) is not None:
+            texts.append(item.text.encode("utf-8"))
+        elif hasattr(item, "tobytes"):
+            # PIL image: hash its pixels; the SDK's PNG encoding is not needed
+            images.append(f"{item.mode}{item.size}".encode() + item.tobytes())
+        else:
+            texts.append(repr(item).encode("utf-8"))
+    return _digest(texts), _digest(images)
+
+
+class Cassette:
+    def __init__(self, directory: str | Path = CASSETTE_DIR):
+        self.directory = Path(directory)
+
+    def key(self, model: str, contents, *configs, history: tuple = ()) -> dict:
+        prompt_hash, image_hash = content_hashes(contents)
+        parts = [model.encode(), prompt_hash.encode(), image_hash.encode()]
+        parts += [_config_json(c) for c in configs]
+        parts += [h.encode() for h in history]
+        return {
+            "key": _digest(parts),
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "image_hash": image_hash,
+        }
+
+    def path(self, request: dict) -> Path:
+        model = storage.safe_dirname(request["model"])
+        return self.directory / model / f"{request['key']}.json"
+
+    def load(self, request: dict) -> tuple[Any, float] | None:
+        """The recorded response and its call duration, if there is one"""
+        from google.genai import types
+
+        try:
+            with open(self.path(request), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        response = types.GenerateContentResponse.model_validate(entry["response"])
+        return response, entry["seconds"]
+
+    def save(self, request: dict, response, seconds: float) -> None:
+        entry = {
+            **request,
+            "seconds": round(seconds, 3),
+            "recorded_at": time.time(),
+            "response": response.model_dump(mode="json", exclude_none=True),
+        }
+        storage.atomic_write_bytes(
+            self.path(request), json.dumps(entry).encode("utf-8")
+        )
+
+
+class CassetteClient:
+    """
+    Stand-in for genai.Client that records or replays through a Cassette.
+    `inner` is the real client; it may be None when only replaying.
+    """
+
+    def __init__(
+        self,
+        inner,
+        mode: str = REPLAY,
+        cassette: Cassette | None = None,
+        replay_latency: bool = REPLAY_LATENCY,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        if inner is None and mode != REPLAY:
+            raise ValueError(f"Cassette mode {mode!r} needs a real client")
+        self.inner = inner
+        self.mode = mode
+        self.cassette = cassette or Cassette()
+        self.replay_latency = replay_latency
+        self.models = _Models(self)
+        self.chats = _Chats(self)
+        self.aio = _AsyncClient(self)
+
+    def _replay(self, request: dict):
+        if self.mode == RECORD:
+            return None
+        found = self.cassette.load(request)
+        if found is None:
+            if self.mode == REPLAY:
+                raise CassetteMiss(
+                    f"No recorded {request['model']} response for {request['key'][:16]}"
+                )
+            return None
+        return found
+
+    def call(self, request: dict, fn, *args, **kwargs):
+        found = self._replay(request)
+        if found is not None:
+            response, seconds = found
+            if self.replay_latency:
+                time.sleep(seconds)
+            return response
+
+        started = time.perf_counter()
+        response = fn(*args, **kwargs)
+        self.cassette.save(request, response, time.perf_counter() - started)
+        return response
+
+    async def acall(self, request: dict, fn, *args, **kwargs):
+        found = self._replay(request)
+        if found is not None:
+            response, seconds = found
+            if self.replay_latency:
+                await asyncio.sleep(seconds)
+            return response
+
+        started = time.perf_counter()
+        response = await fn(*args, **kwargs)
+        self.cassette.save(request, response, time.perf_counter() - started)
+        return response
+
+    def close(self) -> None:
+        if hasattr(self.inner, "close"):
+            self.inner.close()
+
+
+class _Models:
+    def __init__(self, client: CassetteClient):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        request = self._client.cassette.key(model, contents, config)
+        inner = getattr(self._client.inner, "models", None)
+        return self._client.call(
+            request,
+            lambda: inner.generate_content(
+                model=model, contents=contents, config=config
+            ),
+        )
+
+
+class _Chat:
+    def __init__(self, client: CassetteClient, model: str, config):
+        self._client = client
+        self._model = model
+        self._config = config
+        self._inner = None
+        # Keys of the earlier messages; a reply depends on the whole chat
+        self._history: list[str] = []
+
+    def send_message(self, message, config=None):
+        request = self._client.cassette.key(
+            self._model,
+            message,
+            self._config,
+            config,
+            history=tuple(self._history),
+        )
+        self._history.append(request["key"])
+        return self._client.call(request, self._send, message, config)
+
+    def _send(self, message, config):
+        if self._inner is None:
+            self._inner = self._client.inner.chats.create(
+                model=self._model, config=self._config
+            )
+        return self._inner.send_message(message, config=config)
+
+
+class _Chats:
+    def __init__(self, client: CassetteClient):
+        self._client = client
+
+    def create(self, model, config=None):
+        return _Chat(self._client, model, config)
+
+
+class _AsyncModels:
+    def __init__(self, client: CassetteClient):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None):
+        request = self._client.cassette.key(model, contents, config)
+        inner = self._client.inner.aio.models if self._client.inner else None
+        return await self._client.acall(
+            request,
+            lambda: inner.generate_content(
+                model=model, contents=contents, config=config
+            ),
+        )
+
+
+class _AsyncClient:
+    def __init__(self, client: CassetteClient):
+        self._client = client
+        self.models = _AsyncModels(client)
+
+    async def aclose(self) -> None:
+        inner = getattr(self._client.inner, "aio", None)
+        if hasattr(inner, "aclose"):
+            await inner.aclose()
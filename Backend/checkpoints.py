@@ -0,0 +1,211 @@
+"""
+Durable checkpoints for the generation workflows.
+
+After every node that does real work, the workflow state is written to
+assets/_checkpoints_/{workflow}/{job_id}.json. A run that fails (or a server
+that dies) part way leaves its checkpoint behind; the next run with the same
+job id loads it and the graph's entry router sends it straight to the first
+node that has not completed, reusing the run directory and every stage that
+is already on disk. A successful run deletes its checkpoint.
+
+Job ids default to the request's cache key, so a plain retry of the same
+request resumes. Checkpoints older than CHECKPOINT_TTL_HOURS are ignored.
+
+A run holds its job's lease ({job_id}.lock next to the checkpoint: pid and
+host, refreshed with every save) for as long as it runs. Only a checkpoint
+whose run has ended (failed, or died with its process) is resumed; a request
+for a job whose run is still going starts a separate, uncheckpointed run
+instead of taking over its directory. A lease whose process is gone, or that
+hasn't been refreshed for CHECKPOINT_LEASE_MINUTES, is taken over.
+"""
+
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+import storage
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_DIR = storage.ASSETS_DIR / "_checkpoints_"
+TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_HOURS", "24")) * 3600
+LEASE_SECONDS = float(os.getenv("CHECKPOINT_LEASE_MINUTES", "15")) * 60
+
+HOST = socket.gethostname()
+
+# In-memory handoff data that is rebuilt from disk on resume
+TRANSIENT_KEYS = ("previous_image",)
+
+
+class CheckpointStore:
+    def __init__(self, root: str | Path = CHECKPOINTS_DIR):
+        self.root = Path(root)
+        # Leases this process holds
+        self._held: set[Path] = set()
+        self._lock = threading.Lock()
+
+    def path(self, workflow: str, job_id: str) -> Path:
+        return self.root / workflow / f"{storage.safe_dirname(job_id)}.json"
+
+    def lease_path(self, workflow: str, job_id: str) -> Path:
+        return self.path(workflow, job_id).with_suffix(".lock")
+
+    @contextmanager
+    def lease(self, workflow: str, job_id: str):
+        """
+        Hold `job_id`'s lease for the block. Yields the job id to run under:
+        `job_id`, or "" (don't checkpoint) while another live run holds it.
+        """
+        if not self.acquire(workflow, job_id):
+            logger.info(
+                "Job %s is still running; starting a separate run",
+                job_id,
+                extra={"job_id": job_id},
+            )
+            yield ""
+            return
+        try:
+            yield job_id
+        finally:
+            self.release(workflow, job_id)
+
+    def acquire(self, workflow: str, job_id: str) -> bool:
+        path = self.lease_path(workflow, job_id)
+        owner = {"pid": os.getpid(), "host": HOST}
+        with self._lock:
+            if path in self._held:
+                return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A second try after clearing a lease whose run has ended
+            for _ in range(2):
+                try:
+                    fd = os.open(
+                        path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, storage.FILE_MODE
+                    )
+                except FileExistsError:
+                    if not self._expired(path):
+                        return False
+                    # Renaming first means only one contender clears it
+                    stale = path.with_name(f"{path.name}.{uuid.uuid4().hex}")
+                    try:
+                        os.replace(path, stale)
+                    except FileNotFoundError:
+                        continue
+                    stale.unlink(missing_ok=True)
+                    continue
+                with os.fdopen(fd, "w") as f:
+                    json.dump(owner, f)
+                self._held.add(path)
+                return True
+        return False
+
+    def release(self, workflow: str, job_id: str) -> None:
+        path = self.lease_path(workflow, job_id)
+        with self._lock:
+            self._held.discard(path)
+            path.unlink(missing_ok=True)
+
+    def _expired(self, path: Path) -> bool:
+        """Whether the run holding the lease at `path` has ended"""
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return True
+        if age > LEASE_SECONDS:
+            return True
+        try:
+            with open(path, "r") as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return True
+        except (OSError, ValueError):
+            # Still being written by the run taking it
+            return False
+        if owner.get("host") != HOST:
+            return False
+        if owner.get("pid") == os.getpid():
+            return path not in self._held
+        return not pid_alive(owner.get("pid", 0))
+
+    def save(self, workflow: str, node: str, state: dict) -> None:
+        checkpoint = {
+            "job_id": state["job_id"],
+            "workflow": workflow,
+            "node": node,
+            "saved_at": time.time(),
+            "state": {k: v for k, v in state.items() if k not in TRANSIENT_KEYS},
+        }
+        data = json.dumps(checkpoint).encode("utf-8")
+        try:
+            storage.atomic_write_bytes(self.path(workflow, state["job_id"]), data)
+        except OSError as e:
+            logger.warning("Could not save checkpoint after %s: %s", node, e)
+        # Heartbeat: the run holding the lease is still making progress
+        try:
+            os.utime(self.lease_path(workflow, state["job_id"]))
+        except OSError:
+            pass
+
+    def load(self, workflow: str, job_id: str) -> dict | None:
+        """The checkpoint for `job_id`, or None if there is no usable one"""
+        try:
+            with open(self.path(workflow, job_id), "r") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - checkpoint.get("saved_at", 0) > TTL_SECONDS:
+            return None
+        return checkpoint
+
+    def run_ids(self, workflow: str) -> set[str]:
+        """The run of every checkpoint of `workflow` that can still be resumed"""
+        run_ids = set()
+        for path in (self.root / workflow).glob("*.json"):
+            checkpoint = self.load(workflow, path.stem)
+            if checkpoint:
+                run_ids.add(checkpoint["state"].get("run_id", ""))
+        return run_ids
+
+    def clear(self, workflow: str, job_id: str) -> None:
+        try:
+            self.path(workflow, job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+store = CheckpointStore()
+
+
+def checkpointed(workflow: str, node: str, fn: Callable) -> Callable:
+    """
+    Wrap a graph node so the state is checkpointed after it runs. The wrapper
+    keeps `fn`'s signature, so LangGraph still passes it `config` if it takes one.
+    """
+
+    @functools.wraps(fn)
+    def run(state: dict, **kwargs) -> dict:
+        state = fn(state, **kwargs)
+        if state.get("job_id"):
+            store.save(workflow, node, state)
+        return state
+
+    return run
@@ -0,0 +1,92 @@
+"""
+Which things get requested, how often and how recently.
+
+Every progression request records its thing. Popularity is a request count
+that halves every DEMAND_HALF_LIFE_DAYS, so things asked for often *and*
+recently rank first. The table lives in memory and is flushed to
+assets/_demand_.json at most every FLUSH_SECONDS (and on shutdown), so it
+survives restarts without a write per request.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+import storage
+
+logger = logging.getLogger(__name__)
+
+DEMAND_PATH = storage.ASSETS_DIR / "_demand_.json"
+HALF_LIFE_SECONDS = float(os.getenv("DEMAND_HALF_LIFE_DAYS", "7")) * 24 * 3600
+FLUSH_SECONDS = 30
+
+
+class DemandTracker:
+    def __init__(self, path: str | Path = DEMAND_PATH):
+        self.path = Path(path)
+        self._things: dict[str, dict] = self._load()
+        self._dirty = False
+        self._flushed_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, thing: str, now: float | None = None) -> None:
+        thing = thing.strip()
+        if not thing:
+            return
+        now = time.time() if now is None else now
+
+        with self._lock:
+            entry = self._things.setdefault(
+                thing, {"count": 0, "score": 0.0, "first_seen": now, "last_seen": now}
+            )
+            entry["score"] = _decayed(entry, now) + 1
+            entry["count"] += 1
+            entry["last_seen"] = now
+            self._dirty = True
+            due = now - self._flushed_at >= FLUSH_SECONDS
+
+        if due:
+            self.flush()
+
+    def top(self, n: int, now: float | None = None) -> list[dict]:
+        """The `n` most popular things, most popular first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            ranked = [
+                {
+                    "thing": thing,
+                    "score": round(_decayed(entry, now), 3),
+                    "count": entry["count"],
+                    "last_seen": entry["last_seen"],
+                }
+                for thing, entry in self._things.items()
+            ]
+        ranked.sort(key=lambda entry: entry["score"], reverse=True)
+        return ranked[:n]
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._things, indent=2).encode("utf-8")
+            try:
+                storage.atomic_write_bytes(self.path, data)
+            except OSError as e:
+                logger.warning("Could not save demand table: %s", e)
+                return
+            self._dirty = False
+            self._flushed_at = time.time()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def _decayed(entry: dict, now: float) -> float:
+    age = max(0.0, now - entry["last_seen"])
+    return entry["score"] * 0.5 ** (age / HALF_LIFE_SECONDS)
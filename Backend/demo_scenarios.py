@@ -127,6 +127,9 @@ def save_scenario_to_json(scenario_name: str, filename: str):
 
 if __name__ == "__main__":
     import sys
+    import logs
+
+    logs.setup()
 
     if len(sys.argv) < 2:
         print("Usage:")
@@ -0,0 +1,94 @@
+"""
+Compressed derivatives of generated images.
+
+Every saved PNG gets siblings next to it:
+    tree_3.webp          full size WebP
+    tree_3.avif          full size AVIF (when enabled and supported by Pillow)
+    tree_3.small.webp    thumbnail, longest side THUMBNAIL_SIZES["small"]
+    tree_3.medium.webp   thumbnail, longest side THUMBNAIL_SIZES["medium"]
+
+Set IMAGE_AVIF=0 to skip AVIF encoding.
+"""
+
+import io
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+import storage
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+THUMBNAIL_SIZES = {"small": 256, "medium": 768}
+AVIF_REQUESTED = os.getenv("IMAGE_AVIF", "1") != "0"
+
+# Full-size formats a client can ask for through the Accept header, best first
+NEGOTIABLE_FORMATS = {"image/avif": ".avif", "image/webp": ".webp"}
+
+
+def derivative_path(path: str | Path, variant: str) -> Path:
+    """
+    Path of a derivative of `path`. `variant` is a full-size format ("webp",
+    "avif") or a thumbnail name ("small", "medium").
+    """
+    path = Path(path)
+    if variant in THUMBNAIL_SIZES:
+        return path.with_name(f"{path.stem}.{variant}.webp")
+    return path.with_suffix(f".{variant}")
+
+
+@lru_cache(maxsize=None)
+def avif_enabled() -> bool:
+    """Whether AVIF derivatives are written: requested and supported by Pillow"""
+    from PIL import features
+
+    return AVIF_REQUESTED and features.check("avif")
+
+
+def _encode(img: "Image.Image", fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+def create_derivatives(path: str | Path) -> dict[str, str]:
+    """Write all derivatives of the image at `path`; returns {variant: path}"""
+    from PIL import Image
+
+    with Image.open(path) as src:
+        img = src.convert("RGBA" if "A" in src.getbands() else "RGB")
+
+    outputs = {"webp": _encode(img, "WEBP", WEBP_QUALITY)}
+    if avif_enabled():
+        outputs["avif"] = _encode(img, "AVIF", AVIF_QUALITY)
+    for name, size in THUMBNAIL_SIZES.items():
+        thumb = img.copy()
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+        outputs[name] = _encode(thumb, "WEBP", WEBP_QUALITY)
+
+    paths = {}
+    for variant, data in outputs.items():
+        out_path = derivative_path(path, variant)
+        storage.atomic_write_bytes(out_path, data)
+        paths[variant] = str(out_path)
+    return paths
+
+
+def negotiated_paths(path: str, accept: str) -> list[str]:
+    """
+    Candidate files for a request of `path` (a .png) in order of preference,
+    based on the Accept header. The original path is always last.
+    """
+    if not path.endswith(".png"):
+        return [path]
+
+    accept = accept.lower()
+    candidates = [
+        str(derivative_path(path, suffix.lstrip(".")))
+        for mime, suffix in NEGOTIABLE_FORMATS.items()
+        if mime in accept
+    ]
+    return candidates + [path]
@@ -0,0 +1,98 @@
+"""
+Shared Gemini client.
+
+All modules get their client from here so there is exactly one
+genai.Client per process, and with it one keep-alive HTTP connection pool
+for sync calls and one for async calls (`get_async_client()`, i.e.
+`client.aio`). google.genai is slow to import, so it is only imported when
+the client is first needed (or during server warm-up).
+
+Pool settings:
+    GEMINI_POOL_SIZE         max open connections per pool (default 20)
+    GEMINI_KEEPALIVE_SECONDS how long idle connections are kept (default 60)
+    GEMINI_TIMEOUT_SECONDS   per-request timeout (default 300)
+
+With GEMINI_CASSETTE set, the client records or replays responses instead
+(see cassette.py); in replay mode no real client is created at all.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "20"))
+KEEPALIVE_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "60"))
+TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "300"))
+
+_client = None
+_lock = threading.Lock()
+
+
+def api_key() -> str | None:
+    return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+
+def http_options():
+    import httpx
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=POOL_SIZE,
+        max_keepalive_connections=POOL_SIZE,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+    return types.HttpOptions(
+        timeout=int(TIMEOUT_SECONDS * 1000),
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+
+def create_client():
+    import cassette
+
+    if cassette.MODE == cassette.REPLAY:
+        return cassette.CassetteClient(None, cassette.REPLAY)
+
+    from google import genai
+
+    client = genai.Client(api_key=api_key(), http_options=http_options())
+    if cassette.MODE:
+        return cassette.CassetteClient(client, cassette.MODE)
+    return client
+
+
+def get_async_client():
+    """Async view of the shared client; await its methods instead of blocking a thread"""
+    return get_client().aio
+
+
+def set_client(client) -> None:
+    """Replace the shared client, e.g. with a local stand-in for benchmarks"""
+    global _client
+    with _lock:
+        _client = client
+
+
+async def close_client() -> None:
+    """Close both connection pools on shutdown"""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is None:
+        return
+    if hasattr(getattr(client, "aio", None), "aclose"):
+        await client.aio.aclose()
+    if hasattr(client, "close"):
+        client.close()
@@ -0,0 +1,67 @@
+"""
+Logging setup shared by the server and the command-line entry points.
+
+Modules log through `logging.getLogger(__name__)` and pass structured
+fields with `extra={...}`; those fields are appended as key=value pairs in
+text mode and become top-level keys in JSON mode.
+
+    LOG_LEVEL    DEBUG, INFO (default), WARNING or ERROR
+    LOG_FORMAT   text (default) or json, one object per line for collectors
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Configure the root logger once; later calls only change the level"""
+    root = logging.getLogger()
+    root.setLevel(level)
+    if any(getattr(h, "_app_handler", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler._app_handler = True
+    root.addHandler(handler)
+    # Per-request lines from the HTTP client drown out the workflow logs
+    logging.getLogger("httpx").setLevel(max(root.level, logging.WARNING))
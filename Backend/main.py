@@ -1,19 +1,47 @@
+import contextvars
 import os
 import sys
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import TypedDict
-from langgraph.graph import StateGraph, END
-from google import genai
-from PIL import Image
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Iterator, Optional, TypedDict
+import asset_cache
+import checkpoints
+import derivatives
+import gemini
+import logs
+import metrics
+import profiling
+import progress
+import rate_limit
+import singleflight
+import storage
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------
 # Gemini setup
 # ---------------------------------------
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+IMAGE_MODEL = "gemini-2.5-flash-image"
+
+# How stages 2-5 are derived: "sequential" chains each stage to the previous
+# image (five round trips, most consistent); "fanout" renders them all from
+# Stage 1 at once (two round trips)
+SEQUENTIAL = "sequential"
+FANOUT = "fanout"
+PROGRESSION_MODES = (SEQUENTIAL, FANOUT)
+
+# Checkpoint namespace for this workflow
+WORKFLOW = "progression"
+
+# How many times a run may redo stages that fail the quality check
+MAX_REGENERATIONS = int(os.getenv("STAGE_REGENERATIONS", "1"))
 
 
 # ---------------------------------------
@@ -21,11 +49,23 @@ if GOOGLE_API_KEY:
 # ---------------------------------------
 class AssetState(TypedDict):
     thing: str
+    mode: str
+    # Checkpoint id; a run with the id of an unfinished one resumes it
+    job_id: str
     current_stage: int
     prompts: list[str]
     image_paths: list[str]
+    derivatives: list[dict]
+    # Encoded bytes of the last generated stage, sent as the next stage's reference
+    previous_image: bytes | None
+    previous_mime_type: str
+    asset_dir: str
+    run_id: str
     output_dir: str
     error: str | None
+    cached: bool
+    # Stage metrics, rule violations and how many regenerations they caused
+    quality: dict
 
 
 # ---------------------------------------
@@ -112,6 +152,74 @@ The spark must be subtle, painterly, and feel like a natural culmination of Stag
 This is the fully repaired, healthiest, final peak version of the {thing}.
 """,
 }
+
+# Fan-out mode renders stages 2-5 concurrently, each straight from Stage 1,
+# so every prompt describes the total change since Stage 1 rather than a step
+FANOUT_STAGE_PROMPTS = {
+    2: """Use the provided image (Stage 1, the lowest point) as the direct visual reference.
+Preserve the exact silhouette, shapes, proportions, camera angle, framing, layout, and art style.
+No structural changes whatsoever.
+
+This is Stage 2 of 5. Apply a **clear but still moderate improvement (20–25 percent of the full recovery)**:
+• noticeably softer lighting that reduces the bleakness of the reference
+• visible reduction of decay, damage, or dryness (NOT fully healed, but clearly less broken)
+• add gentle warmth to the palette (5–10 percent saturation)
+• shadows become less harsh and less cold
+• textures look slightly smoother and more stable
+• subtle hints of returning life or energy appropriate to the {thing}
+
+This must still feel early in the recovery, but **visibly better** than the reference on first glance.
+No new elements, no geometric changes.
+""",
+    3: """Use the provided image (Stage 1, the lowest point) as the direct visual reference.
+Preserve the exact silhouette, shapes, proportions, camera angle, framing, layout, and art style.
+No structural changes whatsoever.
+
+This is Stage 3 of 5. Apply the combined improvement of two recovery steps (about 45 percent of the full recovery):
+• colors become noticeably richer but still soft
+• surface damage is clearly reduced but not fully gone
+• lighting becomes warmer and more balanced
+• textures appear smoother, healthier, or more stable
+• early signs of vitality or regrowth appropriate to the {thing}
+
+This stage represents “recovering but not yet thriving”: halfway between the reference and full health.
+No new elements, no geometric changes.
+""",
+    4: """Use the provided image (Stage 1, the lowest point) as the direct visual reference.
+Preserve the exact silhouette, shapes, proportions, camera angle, framing, layout, and art style.
+No structural changes whatsoever.
+
+This is Stage 4 of 5. Apply the combined improvement of three recovery steps (about 75 percent of the full recovery):
+• colors become lively but remain consistent with palette
+• lighting becomes distinctly warm, bright, and uplifting
+• textures appear clean, healthy, renewed, or fully repaired
+• the {thing} should look strong, healthy, balanced, and visually appealing
+
+This is the near-final restored form of the {thing}:
+fully functional, beautiful, and alive, but still missing its final signature flourish.
+No new elements, no geometric changes.
+""",
+    5: """Use the provided image (Stage 1, the lowest point) as the direct visual reference.
+Preserve the exact silhouette, shapes, proportions, camera angle, framing, layout, and art style.
+No structural changes whatsoever.
+
+This is Stage 5 of 5. Apply the complete recovery (100 percent):
+• most saturated, vibrant, and harmonious natural colors
+• warmest and cleanest lighting
+• zero damage or decay remaining — everything fully healed or restored
+• maximum vitality, energy, clarity, and expressiveness
+
+Introduce exactly ONE subtle spark element appropriate to the {thing}:
+• small bird or butterfly (nature)
+• glowing fruit, flower cluster, or fresh leaves (plants)
+• soft magical shimmer or highlight (objects or artifacts)
+• a gentle beam of sunlight or miniature rainbow (landscapes)
+• a clean, bright specular highlight (inanimate objects)
+
+The spark must be subtle and painterly.
+This is the fully repaired, healthiest, final peak version of the {thing}.
+""",
+}
 # STAGE_PROMPTS = {
 #     1: """Square image (1:1)
 # flat 2D digital illustration
@@ -197,55 +305,230 @@ This is the fully repaired, healthiest, final peak version of the {thing}.
 # Workflow nodes
 # ---------------------------------------
 def initialize_state(state: AssetState) -> AssetState:
-    print(f"🌱 Initializing asset generation for: {state['thing']}")
+    logger.info(
+        "Initializing asset generation for %s",
+        state["thing"],
+        extra={"thing": state["thing"], "mode": state["mode"]},
+    )
 
-    output_dir = Path("assets") / state["thing"]
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # Each run writes into its own directory; once the run succeeds its
+    # stages are published to the shared assets/{thing}/{thing}_{n}.png paths
+    asset_dir = thing_dir(state["thing"])
+    run_id = storage.new_run_id()
+    output_dir = storage.run_dir(asset_dir, run_id)
 
+    state["asset_dir"] = str(asset_dir)
+    state["run_id"] = run_id
     state["output_dir"] = str(output_dir)
     state["current_stage"] = 1
     state["prompts"] = []
     state["image_paths"] = []
+    state["derivatives"] = []
+    state["previous_image"] = None
+    state["previous_mime_type"] = ""
     state["error"] = None
+    state["cached"] = False
+    state["quality"] = new_quality()
     return state
 
 
-def generate_image(state: AssetState) -> AssetState:
+def generate_image(
+    state: AssetState, config: "Optional[RunnableConfig]" = None
+) -> AssetState:
     stage = state["current_stage"]
-    print(f"🎨 Generating stage {stage}/5")
 
     try:
+        reference = previous_image_part(state) if stage > 1 else None
         prompt = STAGE_PROMPTS[stage].format(thing=state["thing"])
         state["prompts"].append(prompt)
 
-        contents = [prompt]
+        data, mime_type, path = render_stage(state, stage, prompt, reference, config)
+        state["previous_image"] = data
+        state["previous_mime_type"] = mime_type
+        state["image_paths"].append(path)
 
-        if stage > 1:
-            prev_img = Image.open(state["image_paths"][-1])
-            contents.append(prev_img)
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-image",
-            contents=contents,
-        )
+    except Exception as e:
+        fail(state, f"stage_{stage}", f"Stage {stage} failed: {e}")
 
-        output_path = Path(state["output_dir"]) / f"{state['thing']}_{stage}.png"
+    return state
 
-        for part in response.candidates[0].content.parts:
-            if part.inline_data:
-                img = part.as_image()
-                img.save(output_path)
-                state["image_paths"].append(str(output_path))
-                print(f"✅ Saved {output_path}")
-                return state
 
-        raise RuntimeError("No image returned")
+def fan_out_stages(
+    state: AssetState, config: "Optional[RunnableConfig]" = None
+) -> AssetState:
+    """
+    Fan-out mode: render all remaining stages at the same time, each from the
+    Stage 1 image, instead of one after another. A failed stage doesn't
+    discard the others: each one that succeeds is kept and checkpointed, and
+    a resumed run only renders the stages still missing.
+    """
+    total = len(STAGE_PROMPTS)
+    # Slots for stages 1-5; "" marks one that hasn't been rendered
+    for key in ("prompts", "image_paths"):
+        state[key] += [""] * (total - len(state[key]))
+    stages = [
+        stage
+        for stage in range(state["current_stage"], total + 1)
+        if not state["image_paths"][stage - 1]
+    ]
+    prompts = {
+        stage: FANOUT_STAGE_PROMPTS[stage].format(thing=state["thing"])
+        for stage in stages
+    }
 
+    try:
+        reference = previous_image_part(state)
     except Exception as e:
-        state["error"] = f"Stage {stage} failed: {e}"
-        print(f"❌ {state['error']}")
+        fail(state, f"stage_{stages[0]}", f"Stage {stages[0]} failed: {e}")
         return state
 
+    with ThreadPoolExecutor(
+        max_workers=max(1, len(stages)), thread_name_prefix="fanout"
+    ) as pool:
+        # Each stage runs in a copy of the caller's context, so a
+        # rate_limit.tally() around the run counts its calls too
+        futures = {
+            pool.submit(
+                contextvars.copy_context().run,
+                profiling.wrap(render_stage),
+                state,
+                stage,
+                prompts[stage],
+                reference,
+                config,
+            ): stage
+            for stage in stages
+        }
+        for future in as_completed(futures):
+            stage = futures[future]
+            try:
+                _, _, path = future.result()
+            except Exception as e:
+                fail(state, f"stage_{stage}", f"Stage {stage} failed: {e}")
+                continue
+            state["prompts"][stage - 1] = prompts[stage]
+            state["image_paths"][stage - 1] = path
+            if state["job_id"]:
+                checkpoints.store.save(WORKFLOW, "fan_out", state)
+
+    missing = [i + 1 for i, path in enumerate(state["image_paths"]) if not path]
+    state["current_stage"] = missing[0] if missing else total + 1
+    return state
+
+
+def render_stage(
+    state: AssetState,
+    stage: int,
+    prompt: str,
+    reference,
+    config: "Optional[RunnableConfig]",
+) -> tuple[bytes, str, str]:
+    """
+    Request one stage's image, with `reference` (an image part) if given.
+    Saving is queued on the background writer; returns the image bytes,
+    their MIME type and the path they are being saved to.
+    """
+    logger.info(
+        "Generating stage %d/5 of %s",
+        stage,
+        state["thing"],
+        extra={"thing": state["thing"], "stage": stage},
+    )
+    progress.emit(config, stage=stage, total_stages=5, status="generating")
+
+    contents = [prompt] if reference is None else [prompt, reference]
+    started = time.time()
+    response = rate_limit.call(
+        IMAGE_MODEL,
+        gemini.get_client().models.generate_content,
+        model=IMAGE_MODEL,
+        contents=contents,
+    )
+
+    filename = f"{storage.safe_dirname(state['thing'])}_{stage}.png"
+    output_path = Path(state["output_dir"]) / filename
+
+    for part in response.candidates[0].content.parts:
+        if part.inline_data:
+            # Saving happens in the background; the next stage starts now
+            storage.writer.submit(
+                state["run_id"],
+                profiling.wrap(persist_stage),
+                part.inline_data.data,
+                output_path,
+                config,
+                stage=stage,
+                prompt=prompt,
+                started=started,
+            )
+            mime_type = part.inline_data.mime_type or "image/png"
+            return part.inline_data.data, mime_type, str(output_path)
+
+    raise RuntimeError("No image returned")
+
+
+def previous_image_part(state: AssetState):
+    """The previous stage as an inline image part, without decoding it"""
+    from google.genai import types
+
+    data = state.get("previous_image")
+    if data is None:
+        # Not carried in the state (e.g. a resumed run); its file is written
+        storage.writer.wait(state["run_id"])
+        data = Path(state["image_paths"][-1]).read_bytes()
+    return types.Part.from_bytes(
+        data=data, mime_type=state.get("previous_mime_type") or "image/png"
+    )
+
+
+def persist_stage(
+    data: bytes,
+    output_path: Path,
+    config: "Optional[RunnableConfig]",
+    stage: int,
+    prompt: str,
+    started: float,
+) -> tuple[str, dict]:
+    """
+    Background half of a stage: write the PNG into the run directory, report
+    it as saved, then create its derivatives. Returns (path, derivatives).
+    """
+    storage.atomic_write_bytes(output_path, data)
+    metrics.IMAGES_PRODUCED.inc(workflow=WORKFLOW, kind="stage")
+    seconds = round(time.time() - started, 3)
+    logger.info("Saved %s", output_path, extra={"stage": stage, "seconds": seconds})
+    progress.emit(
+        config,
+        stage=stage,
+        total_stages=5,
+        status="saved",
+        image_path=str(output_path),
+        prompt=prompt,
+        seconds=seconds,
+    )
+    return str(output_path), save_derivatives(output_path)
+
+
+def save_derivatives(path: Path) -> dict:
+    """WebP/AVIF and thumbnails for a stage"""
+    try:
+        return derivatives.create_derivatives(path)
+    except Exception as e:
+        logger.warning("Could not create derivatives for %s: %s", path, e)
+        return {}
+
+
+def publish_stages(state: AssetState) -> None:
+    """
+    Copy the run's stages and their derivatives to the shared
+    assets/{thing}/{thing}_{n}.png paths, all at once and only for a run
+    that succeeded and passed validation, so those paths never mix stages
+    of a failed, rejected or concurrent run.
+    """
+    for path, paths in zip(state["image_paths"], state["derivatives"]):
+        for src in [path, *paths.values()]:
+            storage.publish(src, Path(state["asset_dir"]) / Path(src).name)
+
 
 def increment_stage(state: AssetState) -> AssetState:
     state["current_stage"] += 1
@@ -255,67 +538,506 @@ def increment_stage(state: AssetState) -> AssetState:
 def check_completion(state: AssetState) -> str:
     if state["error"] or state["current_stage"] > 5:
         return "end"
+    if state["mode"] == FANOUT:
+        return "fan_out"
     return "continue"
 
 
+def validate_stages(
+    state: AssetState, config: "Optional[RunnableConfig]" = None
+) -> AssetState:
+    """
+    Measure the saved stages and, if one breaks the progression rules, rewind
+    the run to it so only that stage and the ones after it are regenerated.
+    """
+    if state["error"]:
+        return state
+    try:
+        collect_saved(state)
+    except Exception as e:
+        fail(state, "save", f"Saving images failed: {e}")
+        return state
+
+    # Brings in numpy, which nothing else on the request path needs
+    import stage_quality
+
+    try:
+        report = stage_quality.validate(state["image_paths"])
+    except Exception as e:
+        # The check is advisory; an unreadable image shouldn't fail the run
+        logger.warning("Could not validate stages: %s", e)
+        return state
+
+    quality = state["quality"]
+    quality["metrics"] = report["metrics"]
+    quality["violations"] = report["violations"]
+    bad = report["first_bad_stage"]
+    if bad is None:
+        return state
+    if quality["regenerations"] >= MAX_REGENERATIONS:
+        logger.warning(
+            "Stage %d still fails the quality check; keeping it",
+            bad,
+            extra={"thing": state["thing"], "stage": bad},
+        )
+        return state
+
+    rules = sorted({v["rule"] for v in report["violations"] if v["stage"] == bad})
+    logger.info(
+        "Stage %d failed %s; regenerating stages %d-5",
+        bad,
+        ", ".join(rules),
+        bad,
+        extra={"thing": state["thing"], "stage": bad},
+    )
+    progress.emit(
+        config,
+        stage=bad,
+        total_stages=5,
+        status="regenerating",
+        violations=report["violations"],
+    )
+    quality["regenerations"] += 1
+
+    rewind(state, bad)
+    return state
+
+
+def check_quality(state: AssetState) -> str:
+    if state["error"] or state["current_stage"] > 5:
+        return "done"
+    if state["mode"] == FANOUT:
+        return "fan_out"
+    return "regenerate"
+
+
+def rewind(state: AssetState, stage: int) -> None:
+    """Drop `stage` and everything after it so the run continues from there"""
+    for key in ("prompts", "image_paths", "derivatives"):
+        state[key] = state[key][: stage - 1]
+    state["current_stage"] = stage
+    if stage > 1:
+        # Sequential stages continue from the stage before; fan-out ones from Stage 1
+        reference = state["image_paths"][0 if state["mode"] == FANOUT else -1]
+        state["previous_image"] = Path(reference).read_bytes()
+        state["previous_mime_type"] = "image/png"
+
+
+def collect_saved(state: AssetState) -> None:
+    """Wait for the run's background saves and line their derivatives up with the stages"""
+    saved = dict(storage.writer.wait(state["run_id"]))
+    known = dict(zip(state["image_paths"], state["derivatives"]))
+    state["derivatives"] = [
+        saved.get(path) or known.get(path) or derivatives_on_disk(path)
+        for path in state["image_paths"]
+    ]
+
+
+def derivatives_on_disk(path: str) -> dict:
+    """Derivatives of a stage saved by an earlier attempt of a resumed run"""
+    if not path:
+        return {}
+    variants = ["webp", "avif", *derivatives.THUMBNAIL_SIZES]
+    found = {v: derivatives.derivative_path(path, v) for v in variants}
+    return {v: str(p) for v, p in found.items() if p.is_file()}
+
+
 def finalize(state: AssetState) -> AssetState:
+    # Stages were saved in the background; the run is done once they are on disk
+    try:
+        collect_saved(state)
+    except Exception as e:
+        if not state["error"]:
+            fail(state, "save", f"Saving images failed: {e}")
+    # The bytes were only needed for the handoff; don't return them to callers
+    state["previous_image"] = None
+
+    if not state["error"] and not state.get("cached"):
+        try:
+            publish_stages(state)
+        except OSError as e:
+            fail(state, "publish", f"Publishing images failed: {e}")
+
     if state["error"]:
-        print(f"\n❌ Failed: {state['error']}")
+        logger.error(
+            "Progression of %s failed: %s",
+            state["thing"],
+            state["error"],
+            extra={"thing": state["thing"]},
+        )
     else:
-        print("\n✨ All 5 stages complete!")
-        print(f"📁 Output: {state['output_dir']}")
+        logger.info(
+            "All 5 stages of %s complete: %s",
+            state["thing"],
+            state["output_dir"],
+            extra={"thing": state["thing"], "run_id": state["run_id"]},
+        )
+        if not state.get("cached"):
+            save_progression_manifest(state)
+        if state.get("job_id"):
+            checkpoints.store.clear(WORKFLOW, state["job_id"])
+    if not state.get("cached"):
+        prune_runs(state)
     return state
 
 
+def fail(state: AssetState, stage: str, message: str) -> None:
+    """Mark the run as failed at `stage` (e.g. "stage_3" or "save")"""
+    state["error"] = message
+    metrics.FAILURES.inc(workflow=WORKFLOW, stage=stage)
+    logger.error(message, extra={"thing": state["thing"], "stage": stage})
+
+
+def resume_point(state: AssetState) -> str:
+    """Entry router: the first node a (possibly resumed) run still has to do"""
+    if not state["run_id"]:
+        return "initialize"
+    if state["current_stage"] > len(STAGE_PROMPTS):
+        return "validate"
+    if state["mode"] == FANOUT and state["current_stage"] > 1:
+        return "fan_out"
+    return "generate"
+
+
+# ---------------------------------------
+# Progression cache
+# ---------------------------------------
+def normalize_thing(thing: str) -> str:
+    """
+    The one spelling of `thing` used for its prompts, cache key, in-flight key
+    and directories: whitespace collapsed, and made a safe directory name so
+    that two spellings never share a directory without being the same thing.
+    """
+    return storage.safe_dirname(" ".join(thing.split()))
+
+
+def thing_dir(thing: str) -> Path:
+    return storage.ASSETS_DIR / storage.safe_dirname(thing)
+
+
+def manifest_dir(thing: str, mode: str = SEQUENTIAL) -> Path:
+    # Each mode keeps its own manifest so switching modes doesn't evict the other
+    if mode == SEQUENTIAL:
+        return thing_dir(thing)
+    return thing_dir(thing) / mode
+
+
+def stage_prompts(mode: str = SEQUENTIAL) -> dict[int, str]:
+    if mode == FANOUT:
+        return {**STAGE_PROMPTS, **FANOUT_STAGE_PROMPTS}
+    return STAGE_PROMPTS
+
+
+def progression_cache_key(thing: str, mode: str = SEQUENTIAL) -> str:
+    """Cache key covering the thing, the exact stage prompt text and the model"""
+    prompts_text = json.dumps(stage_prompts(mode), sort_keys=True)
+    return asset_cache.hash_text(thing, prompts_text, IMAGE_MODEL)
+
+
+def save_progression_manifest(state: AssetState) -> None:
+    try:
+        asset_cache.save_manifest(
+            manifest_dir(state["thing"], state["mode"]),
+            {
+                "key": progression_cache_key(state["thing"], state["mode"]),
+                "thing": state["thing"],
+                "mode": state["mode"],
+                "model": IMAGE_MODEL,
+                "run_id": state["run_id"],
+                "output_dir": state["output_dir"],
+                "prompts": state["prompts"],
+                "image_paths": state["image_paths"],
+                "derivatives": state["derivatives"],
+                "quality": state["quality"],
+                "created_at": time.time(),
+            },
+        )
+    except OSError as e:
+        logger.warning("Could not write cache manifest: %s", e)
+
+
+def prune_runs(state: AssetState) -> None:
+    """
+    Delete the thing's run directories that neither a manifest (of any mode)
+    nor a resumable checkpoint refers to any more.
+    """
+    keep = checkpoints.store.run_ids(WORKFLOW)
+    for mode in PROGRESSION_MODES:
+        manifest = asset_cache.load_manifest(manifest_dir(state["thing"], mode))
+        if manifest:
+            keep.add(manifest.get("run_id", ""))
+    try:
+        removed = storage.prune_runs(state["asset_dir"], keep)
+    except OSError as e:
+        logger.warning("Could not prune runs of %s: %s", state["thing"], e)
+        return
+    if removed:
+        logger.info(
+            "Pruned %d old runs of %s",
+            len(removed),
+            state["thing"],
+            extra={"thing": state["thing"]},
+        )
+
+
+def load_cached_progression(thing: str, mode: str = SEQUENTIAL) -> AssetState | None:
+    thing = normalize_thing(thing)
+    asset_dir = thing_dir(thing)
+    manifest = asset_cache.lookup(
+        manifest_dir(thing, mode), progression_cache_key(thing, mode), "image_paths"
+    )
+    if manifest is None or len(manifest["image_paths"]) != len(STAGE_PROMPTS):
+        return None
+
+    return {
+        "thing": thing,
+        "mode": mode,
+        "job_id": "",
+        "current_stage": len(STAGE_PROMPTS) + 1,
+        "prompts": manifest["prompts"],
+        "image_paths": manifest["image_paths"],
+        "derivatives": manifest.get("derivatives", []),
+        "previous_image": None,
+        "previous_mime_type": "",
+        "asset_dir": str(asset_dir),
+        "run_id": manifest.get("run_id", ""),
+        "output_dir": manifest.get("output_dir", str(asset_dir)),
+        "error": None,
+        "cached": True,
+        "quality": manifest.get("quality", new_quality()),
+    }
+
+
 # ---------------------------------------
 # Workflow construction
 # ---------------------------------------
 def create_workflow():
+    # langgraph takes most of a second to import, so load it on first use
+    from langgraph.graph import StateGraph, START, END
+
     g = StateGraph(AssetState)
 
-    g.add_node("initialize", initialize_state)
-    g.add_node("generate", generate_image)
-    g.add_node("increment", increment_stage)
-    g.add_node("finalize", finalize)
+    def node(name, fn, checkpoint=True):
+        if checkpoint:
+            fn = checkpoints.checkpointed(WORKFLOW, name, fn)
+        g.add_node(name, metrics.timed_node(WORKFLOW, name, fn))
+
+    node("initialize", initialize_state)
+    node("generate", generate_image)
+    node("increment", increment_stage, checkpoint=False)
+    node("fan_out", fan_out_stages)
+    node("validate", validate_stages)
+    node("finalize", finalize, checkpoint=False)
 
-    g.set_entry_point("initialize")
+    g.add_conditional_edges(
+        START,
+        resume_point,
+        {
+            "initialize": "initialize",
+            "generate": "generate",
+            "fan_out": "fan_out",
+            "validate": "validate",
+        },
+    )
     g.add_edge("initialize", "generate")
     g.add_edge("generate", "increment")
 
     g.add_conditional_edges(
         "increment",
         check_completion,
-        {"continue": "generate", "end": "finalize"},
+        {"continue": "generate", "fan_out": "fan_out", "end": "validate"},
     )
 
+    g.add_edge("fan_out", "validate")
+    g.add_conditional_edges(
+        "validate",
+        check_quality,
+        {"regenerate": "generate", "fan_out": "fan_out", "done": "finalize"},
+    )
     g.add_edge("finalize", END)
     return g.compile()
 
 
+@lru_cache(maxsize=1)
+def get_workflow():
+    """The compiled workflow, built once per process and shared by all requests"""
+    return create_workflow()
+
+
 # ---------------------------------------
 # Entry point
 # ---------------------------------------
-def generate_asset_progression(thing: str):
-    initial_state: AssetState = {
+# Coalesces identical progression requests that arrive while one is running
+inflight = singleflight.SingleFlight(WORKFLOW)
+
+
+def generate_asset_progression(
+    thing: str,
+    use_cache: bool = True,
+    on_progress: progress.ProgressCallback | None = None,
+    mode: str = SEQUENTIAL,
+    job_id: str | None = None,
+    resume: bool = True,
+):
+    """
+    Generate the five stages for `thing`. `mode` is SEQUENTIAL (each stage
+    from the previous one) or FANOUT (stages 2-5 concurrently from stage 1,
+    lower latency at some cost in cross-stage consistency).
+
+    Progress is checkpointed under `job_id` (by default the cache key, so a
+    retry of the same request matches); with `resume`, a run with that id
+    that failed or died continues from its first incomplete stage. While
+    one is still running, the call starts a separate run instead.
+
+    Identical calls (the same thing after normalize_thing) made while one is
+    running share its run and result.
+    """
+    if mode not in PROGRESSION_MODES:
+        raise ValueError(f"Unknown progression mode {mode!r}")
+
+    thing = normalize_thing(thing)
+    key = (thing, mode, use_cache, job_id, resume)
+    return inflight.do(
+        key,
+        lambda report: run_progression(thing, use_cache, report, mode, job_id, resume),
+        on_progress,
+    )
+
+
+def run_progression(
+    thing: str,
+    use_cache: bool,
+    on_progress: progress.ProgressCallback | None,
+    mode: str,
+    job_id: str | None,
+    resume: bool,
+) -> AssetState:
+    if use_cache:
+        cached = load_cached_progression(thing, mode)
+        metrics.CACHE_LOOKUPS.inc(
+            workflow=WORKFLOW, result="miss" if cached is None else "hit"
+        )
+        if cached is not None:
+            logger.info(
+                "Cache hit for %s: %s",
+                thing,
+                cached["output_dir"],
+                extra={"thing": thing},
+            )
+            return cached
+
+    job_id = job_id or progression_cache_key(thing, mode)
+    with checkpoints.store.lease(WORKFLOW, job_id) as job_id:
+        state = resume_progression(thing, mode, job_id) if resume and job_id else None
+        if state is None:
+            state = {**new_state(thing, mode), "job_id": job_id}
+
+        app = get_workflow()
+        return app.invoke(state, config=progress.run_config(on_progress))
+
+
+def resume_progression(thing: str, mode: str, job_id: str) -> AssetState | None:
+    """The checkpointed state of job `job_id`, trimmed to the stages on disk"""
+    checkpoint = checkpoints.store.load(WORKFLOW, job_id)
+    if checkpoint is None:
+        return None
+
+    state = {**new_state(thing, mode), **checkpoint["state"], "error": None}
+    on_disk = [bool(path) and Path(path).is_file() for path in state["image_paths"]]
+    saved = on_disk.index(False) if False in on_disk else len(on_disk)
+    if state["mode"] == FANOUT and saved:
+        # Fan-out stages only build on Stage 1: keep every one that is on
+        # disk and leave the gaps for fan_out_stages to fill
+        for key in ("prompts", "image_paths"):
+            state[key] = [v if ok else "" for v, ok in zip(state[key], on_disk)]
+        state["current_stage"] = saved + 1
+        state["previous_image"] = Path(state["image_paths"][0]).read_bytes()
+        state["previous_mime_type"] = "image/png"
+    else:
+        rewind(state, saved + 1)
+    logger.info(
+        "Resuming %s at stage %d (run %s)",
+        thing,
+        saved + 1,
+        state["run_id"],
+        extra={"thing": thing, "job_id": job_id},
+    )
+    return state
+
+
+def generate_asset_progressions(
+    things: list[str],
+    max_parallel: int = 4,
+    use_cache: bool = True,
+    on_progress: progress.ProgressCallback | None = None,
+    mode: str = SEQUENTIAL,
+) -> Iterator[tuple[str, AssetState]]:
+    """
+    Generate progressions for several things, up to `max_parallel` at a time.
+
+    In sequential mode each thing's stages still run in order (stage N needs
+    stage N-1's image); only different things overlap. Yields (thing, result) as each one finishes,
+    with the thing spelled as normalize_thing returns it; stage events passed
+    to `on_progress` are tagged with it too.
+    """
+    unique_things = list(dict.fromkeys(normalize_thing(thing) for thing in things))
+    if not unique_things:
+        return
+
+    def run(thing: str) -> AssetState:
+        def tagged(event: dict) -> None:
+            on_progress({**event, "thing": thing})
+
+        try:
+            return generate_asset_progression(
+                thing,
+                use_cache=use_cache,
+                on_progress=tagged if on_progress else None,
+                mode=mode,
+            )
+        except Exception as e:
+            return {**new_state(thing, mode), "error": f"{thing} failed: {e}"}
+
+    workers = max(1, min(max_parallel, len(unique_things)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(run, thing): thing for thing in unique_things}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def new_state(thing: str, mode: str = SEQUENTIAL) -> AssetState:
+    return {
         "thing": thing,
+        "mode": mode,
+        "job_id": "",
         "current_stage": 1,
         "prompts": [],
         "image_paths": [],
+        "derivatives": [],
+        "previous_image": None,
+        "previous_mime_type": "",
+        "asset_dir": "",
+        "run_id": "",
         "output_dir": "",
         "error": None,
+        "cached": False,
+        "quality": new_quality(),
     }
 
-    app = create_workflow()
-    return app.invoke(initial_state)
+
+def new_quality() -> dict:
+    return {"metrics": [], "violations": [], "regenerations": 0}
 
 
 if __name__ == "__main__":
+    logs.setup()
     if len(sys.argv) < 2:
-        print('Usage: python main.py "tree"')
+        print('Usage: python main.py "tree" [sequential|fanout]')
         sys.exit(1)
 
     thing = sys.argv[1]
-    result = generate_asset_progression(thing)
+    mode = sys.argv[2] if len(sys.argv) > 2 else SEQUENTIAL
+    result = generate_asset_progression(thing, mode=mode)
 
     if not result["error"]:
         print(f"\n🎉 Generated {len(result['image_paths'])} images")
@@ -0,0 +1,172 @@
+"""
+Process-wide counters and latency histograms, rendered in the Prometheus
+text exposition format for the server's /metrics endpoint.
+
+    NODE_SECONDS      every LangGraph node of both workflows
+    GEMINI_SECONDS    every Gemini call attempt, by model and outcome
+    BYTES_WRITTEN     bytes written through storage.atomic_write_bytes
+    IMAGES_PRODUCED   stage images, landscape panels and final landscapes
+    FAILURES          failed stages / steps, by workflow and stage
+    CACHE_LOOKUPS     result cache hits and misses
+    COALESCED_CALLS   calls that joined an identical in-flight run
+
+Label values are free-form strings; keep them low-cardinality (no things,
+run ids or paths).
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+import profiling
+
+# Seconds; spans everything from a prompt build to a 4K landscape
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count, sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                labels = _labels(self.label_names, key, le=f"{bound:g}")
+                lines.append(f"{self.name}_bucket{labels} {count:g}")
+            labels = _labels(self.label_names, key, le="+Inf")
+            lines.append(f"{self.name}_bucket{labels} {values[-2]:g}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {values[-1]:g}")
+            lines.append(f"{self.name}_count{labels} {values[-2]:g}")
+        return lines
+
+
+NODE_SECONDS = Histogram(
+    "workflow_node_seconds",
+    "Wall-clock time of one workflow node run",
+    ("workflow", "node"),
+)
+GEMINI_SECONDS = Histogram(
+    "gemini_call_seconds",
+    "Duration of one Gemini call attempt",
+    ("model", "outcome"),
+)
+BYTES_WRITTEN = Counter(
+    "storage_bytes_written_total", "Bytes written through atomic_write_bytes"
+)
+IMAGES_PRODUCED = Counter(
+    "images_produced_total", "Images generated and saved", ("workflow", "kind")
+)
+FAILURES = Counter(
+    "workflow_failures_total", "Failed workflow steps", ("workflow", "stage")
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Result cache lookups", ("workflow", "result")
+)
+COALESCED_CALLS = Counter(
+    "coalesced_calls_total",
+    "Calls served by an identical run that was already in flight",
+    ("workflow",),
+)
+
+REGISTRY = [
+    NODE_SECONDS,
+    GEMINI_SECONDS,
+    BYTES_WRITTEN,
+    IMAGES_PRODUCED,
+    FAILURES,
+    CACHE_LOOKUPS,
+    COALESCED_CALLS,
+]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def timed_node(workflow: str, node: str, fn: Callable) -> Callable:
+    """
+    Wrap a graph node so its run time lands in NODE_SECONDS (and in the
+    request's profile, when it is being profiled). Like
+    checkpoints.checkpointed, the wrapper keeps `fn`'s signature.
+    """
+
+    @functools.wraps(fn)
+    def run(state: dict, **kwargs) -> dict:
+        with NODE_SECONDS.time(workflow=workflow, node=node):
+            with profiling.span("node", f"{workflow}.{node}"):
+                return fn(state, **kwargs)
+
+    return run
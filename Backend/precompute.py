@@ -0,0 +1,192 @@
+"""
+Off-peak precomputation of popular progressions.
+
+A background thread wakes every PRECOMPUTE_INTERVAL_SECONDS. Inside the
+off-peak window, and only while no other generation is running, it renders
+the missing (uncached) progressions of the most requested things, so that
+interactive /generate calls find them already on disk.
+
+    PRECOMPUTE=0                     turn it off
+    PRECOMPUTE_HOURS="2-6"           off-peak window in local hours, [start, end);
+                                     may wrap midnight, e.g. "22-5"
+    PRECOMPUTE_TOP_N=20              how many of the top things to keep warm
+    PRECOMPUTE_DAILY_CALLS=100       image calls it may spend per day
+    PRECOMPUTE_INTERVAL_SECONDS=300  how often it checks
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable
+import main
+import rate_limit
+import storage
+from demand import DemandTracker
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PRECOMPUTE", "1") != "0"
+HOURS = os.getenv("PRECOMPUTE_HOURS", "2-6")
+TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", "20"))
+DAILY_CALLS = int(os.getenv("PRECOMPUTE_DAILY_CALLS", "100"))
+INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "300"))
+
+# Calls spent today, kept on disk so a restart doesn't reset the budget
+BUDGET_PATH = storage.ASSETS_DIR / "_precompute_.json"
+
+
+def parse_hours(hours: str) -> tuple[int, int]:
+    start, end = (int(h) for h in hours.split("-"))
+    if not (0 <= start <= 23 and 0 <= end <= 24):
+        raise ValueError(f"Invalid PRECOMPUTE_HOURS {hours!r}")
+    return start, end
+
+
+def in_window(hour: int, window: tuple[int, int]) -> bool:
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class Precomputer:
+    """
+    Spends up to `daily_calls` image calls a day on progressions for the
+    `top_n` most requested things that are not cached yet. `is_idle` is
+    checked before every progression so interactive traffic comes first.
+    """
+
+    def __init__(
+        self,
+        tracker: DemandTracker,
+        is_idle: Callable[[], bool],
+        top_n: int = TOP_N,
+        daily_calls: int = DAILY_CALLS,
+        hours: str = HOURS,
+    ):
+        self.tracker = tracker
+        self.is_idle = is_idle
+        self.top_n = top_n
+        self.daily_calls = daily_calls
+        self.window = parse_hours(hours)
+        self.last_run: dict = {}
+        self._budget = self._load_budget()
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def calls_per_progression(self) -> int:
+        """Most calls a progression makes, regenerating every stage; no retries"""
+        return len(main.STAGE_PROMPTS) * (1 + main.MAX_REGENERATIONS)
+
+    def start(self, interval: float = INTERVAL_SECONDS) -> None:
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval,), name="precompute", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def candidates(self) -> list[str]:
+        """Top things whose progression is not cached, most popular first"""
+        return [
+            entry["thing"]
+            for entry in self.tracker.top(self.top_n)
+            if main.load_cached_progression(entry["thing"]) is None
+        ]
+
+    def run_once(self, force: bool = False) -> list[str]:
+        """
+        Precompute what the window, idleness and budget allow; returns the
+        things generated. `force` ignores the off-peak window (not the budget).
+        """
+        if not force and not in_window(time.localtime().tm_hour, self.window):
+            return []
+        if not self._running.acquire(blocking=False):
+            return []
+
+        generated, failed = [], []
+        try:
+            for thing in self.candidates():
+                if self._stop.is_set() or not self.is_idle():
+                    break
+                reserved = self.calls_per_progression
+                if not self._spend(reserved):
+                    logger.info("Precompute budget for today used up")
+                    break
+
+                logger.info("Precomputing %s", thing, extra={"thing": thing})
+                # Only this run's own attempts; interactive calls overlapping it
+                # go through the same limiter but aren't billed here
+                with rate_limit.tally() as spent:
+                    try:
+                        result = main.generate_asset_progression(thing)
+                    finally:
+                        made = spent.calls.get(main.IMAGE_MODEL, 0)
+                        self._charge(made - reserved)
+                (failed if result["error"] else generated).append(thing)
+        finally:
+            self._running.release()
+
+        self.last_run = {
+            "at": time.time(),
+            "generated": generated,
+            "failed": failed,
+        }
+        return generated
+
+    def status(self) -> dict:
+        return {
+            "enabled": self._thread is not None and not self._stop.is_set(),
+            "running": self._running.locked(),
+            "hours": f"{self.window[0]}-{self.window[1]}",
+            "top_n": self.top_n,
+            "daily_calls": self.daily_calls,
+            "calls_today": self._today()["calls"],
+            "last_run": self.last_run,
+        }
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning("Precompute run failed: %s", e)
+
+    def _today(self) -> dict:
+        today = time.strftime("%Y-%m-%d")
+        if self._budget.get("day") != today:
+            self._budget = {"day": today, "calls": 0}
+        return self._budget
+
+    def _spend(self, calls: int) -> bool:
+        """Reserve `calls` from today's budget, if they fit"""
+        if self._today()["calls"] + calls > self.daily_calls:
+            return False
+        self._charge(calls)
+        return True
+
+    def _charge(self, calls: int) -> None:
+        """
+        Add `calls` to today's spend. A run reserves its worst case up front
+        and is then settled with the attempts it really made, retries and
+        regenerations included: the difference is charged even past the
+        budget, or refunded when negative.
+        """
+        budget = self._today()
+        budget["calls"] = max(0, budget["calls"] + calls)
+        try:
+            storage.atomic_write_bytes(BUDGET_PATH, json.dumps(budget).encode("utf-8"))
+        except OSError as e:
+            logger.warning("Could not save precompute budget: %s", e)
+
+    def _load_budget(self) -> dict:
+        try:
+            with open(BUDGET_PATH, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
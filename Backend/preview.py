@@ -0,0 +1,182 @@
+"""
+Local preview of a survey landscape, composited from cached stage images.
+
+An answer {"category": "tree", "score": 3} maps to the stage image
+assets/tree/tree_3.png that the progression workflow already rendered. The
+preview cuts each one out of its painted background, scales and layers them
+over a sky gradient whose mood follows the average score, and blends them in
+with feathered edges. No Gemini call, so it takes a fraction of a second;
+answers without a cached stage image are reported as missing and left out.
+"""
+
+import io
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+import derivatives
+import storage
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+PREVIEW_SIZE = (1280, 720)
+PREVIEW_NAME = "preview_landscape.png"
+
+# Categories drawn in the sky band instead of standing on the ground
+SKY_WORDS = ("sky", "sun", "cloud", "moon", "star", "rainbow", "bird", "butterfl")
+
+# Background removal: border-colour distance (0-441) below which a pixel is
+# background, and the width of the soft ramp above it
+BACKGROUND_TOLERANCE = 40.0
+BACKGROUND_RAMP = 50.0
+FEATHER_RADIUS = 6
+
+# Sky gradient (top, horizon) for the bleakest and the brightest average score
+BLEAK_SKY = ((92, 98, 108), (150, 152, 150))
+BRIGHT_SKY = ((110, 170, 235), (255, 214, 160))
+
+
+def stage_image_path(category: str, score: int) -> Path | None:
+    """The cached stage image for an answer, or None if it was never rendered"""
+    name = storage.safe_dirname(" ".join(str(category).split()))
+    path = storage.ASSETS_DIR / name / f"{name}_{score}.png"
+    return path if path.is_file() else None
+
+
+def load_stage_image(path: Path, max_side: int) -> "Image.Image":
+    from PIL import Image
+
+    # The medium thumbnail is a fraction of the PNG's decode cost when it is enough
+    medium = derivatives.derivative_path(path, "medium")
+    if medium.is_file() and max_side <= derivatives.THUMBNAIL_SIZES["medium"]:
+        path = medium
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return img
+
+
+def remove_background(img: "Image.Image") -> "Image.Image":
+    """
+    RGBA cut-out of the subject. The background colour is the median of the
+    outer border; pixels close to it fade out, and an elliptical vignette
+    softens whatever background is left so it never shows a hard square edge.
+    """
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    rgb = np.asarray(img.convert("RGB"), dtype=np.float32)
+    h, w, _ = rgb.shape
+    border = max(2, min(h, w) // 32)
+    ring = np.concatenate(
+        [
+            rgb[:border].reshape(-1, 3),
+            rgb[-border:].reshape(-1, 3),
+            rgb[:, :border].reshape(-1, 3),
+            rgb[:, -border:].reshape(-1, 3),
+        ]
+    )
+    background = np.median(ring, axis=0)
+
+    distance = np.linalg.norm(rgb - background, axis=2)
+    alpha = np.clip((distance - BACKGROUND_TOLERANCE) / BACKGROUND_RAMP, 0.0, 1.0)
+
+    ys = np.linspace(-1.0, 1.0, h, dtype=np.float32)[:, None]
+    xs = np.linspace(-1.0, 1.0, w, dtype=np.float32)[None, :]
+    vignette = np.clip((1.0 - np.sqrt(xs**2 + ys**2)) / 0.25, 0.0, 1.0)
+    alpha = np.minimum(alpha, vignette)
+
+    mask = Image.fromarray((alpha * 255).astype(np.uint8), mode="L")
+    mask = mask.filter(ImageFilter.GaussianBlur(FEATHER_RADIUS))
+    out = img.convert("RGBA")
+    out.putalpha(mask)
+    return out
+
+
+def sky_background(size: tuple[int, int], mood: float) -> "Image.Image":
+    """Vertical gradient between BLEAK_SKY and BRIGHT_SKY; `mood` is 0..1"""
+    import numpy as np
+    from PIL import Image
+
+    w, h = size
+    top = np.add(np.multiply(BLEAK_SKY[0], 1 - mood), np.multiply(BRIGHT_SKY[0], mood))
+    horizon = np.add(
+        np.multiply(BLEAK_SKY[1], 1 - mood), np.multiply(BRIGHT_SKY[1], mood)
+    )
+    t = np.linspace(0.0, 1.0, h, dtype=np.float32)[:, None]
+    column = top[None, :] * (1 - t) + horizon[None, :] * t
+    pixels = np.broadcast_to(column[:, None, :], (h, w, 3))
+    return Image.fromarray(pixels.astype(np.uint8), mode="RGB").convert("RGBA")
+
+
+def layout(
+    answers: list[dict], size: tuple[int, int]
+) -> list[tuple[dict, int, int, int]]:
+    """
+    (answer, centre x, baseline y, max side) per answer, back to front. Sky
+    things spread along the top; the rest stand on two ground rows, the
+    back row smaller, so later (front) items overlap earlier ones.
+    """
+    w, h = size
+    sky = [
+        a for a in answers if any(word in a["category"].lower() for word in SKY_WORDS)
+    ]
+    ground = [a for a in answers if a not in sky]
+    back, front = ground[1::2], ground[0::2]
+
+    placed = []
+    for row, baseline, side, offset in (
+        (sky, 0.38, 0.34, 0.5),
+        (back, 0.72, 0.42, 1.0),
+        (front, 0.98, 0.56, 0.5),
+    ):
+        # The back row sits between the front row's slots so both stay visible
+        slots = len(row) + (1 if offset == 1.0 else 0)
+        for i, answer in enumerate(row):
+            x = int(w * (i + offset) / slots)
+            placed.append((answer, x, int(h * baseline), int(h * side)))
+    return placed
+
+
+def compose_preview(
+    survey_answers: list[dict], size: tuple[int, int] = PREVIEW_SIZE
+) -> tuple["Image.Image", list[dict]]:
+    """The composited landscape and the answers that had no stage image"""
+    mood = (sum(a["score"] for a in survey_answers) / len(survey_answers) - 1) / 4
+    canvas = sky_background(size, mood)
+
+    missing = []
+    for answer, x, baseline, side in layout(survey_answers, size):
+        path = stage_image_path(answer["category"], answer["score"])
+        if path is None:
+            missing.append(answer)
+            continue
+        element = remove_background(load_stage_image(path, side))
+        canvas.alpha_composite(
+            element,
+            dest=(x - element.width // 2, max(0, baseline - element.height)),
+        )
+
+    return canvas.convert("RGB"), missing
+
+
+def render_preview(
+    survey_answers: list[dict],
+    output_dir: str | Path,
+    size: tuple[int, int] = PREVIEW_SIZE,
+) -> dict:
+    """Compose and save a preview; returns its path, missing answers and timing"""
+    started = time.perf_counter()
+    img, missing = compose_preview(survey_answers, size)
+
+    path = Path(output_dir) / PREVIEW_NAME
+    buf = io.BytesIO()
+    # Fast compression: this file is throwaway and latency matters more than bytes
+    img.save(buf, format="PNG", compress_level=1)
+    storage.atomic_write_bytes(path, buf.getvalue())
+
+    return {
+        "image_path": str(path),
+        "missing": missing,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,372 @@
+"""
+Opt-in profiling of single server requests, for diagnosing slow outliers
+in production without redeploying.
+
+An admin sends a request with `?profile=1` (or `X-Profile: 1`) and the
+ADMIN_TOKEN in `X-Admin-Token`. That request then runs with:
+  • cProfile enabled on every thread that works for it: the endpoint's
+    worker thread, where the LangGraph nodes run, and the fan-out, panel
+    and background-writer threads it hands work to (see `wrap`). From
+    Python 3.12 cProfile is process-wide: one profiler covers all of those
+    threads (and whatever else runs meanwhile), and only one request can
+    hold it at a time; a concurrent profiled request gets spans only.
+  • a wall-clock span for every workflow node, Gemini call attempt and
+    wait on a coalesced run
+
+The response carries an `X-Profile-Id` header. GET /profiles/{id} returns
+the span breakdown and the slowest functions, GET /profiles/{id}/pstats
+the raw profile for snakeviz / pstats.
+
+Only whole-response endpoints are covered: async endpoints run on the
+shared event loop, which is not profiled (their spans are still recorded),
+and work handed to background jobs outlives the request.
+
+    ADMIN_TOKEN     required to profile; without it the switch is ignored
+    PROFILES_DIR    where profiles are kept (default "profiles", outside
+                    the public assets mount)
+    PROFILES_KEEP   how many profiles to keep (default 50, oldest go first)
+"""
+
+import asyncio
+import cProfile
+import functools
+import hmac
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILES_DIR = Path(os.getenv("PROFILES_DIR", "profiles"))
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", "50"))
+
+TOKEN_HEADER = "x-admin-token"
+SWITCH_HEADER = "x-profile"
+ID_HEADER = "X-Profile-Id"
+# How many functions GET /profiles/{id} lists
+TOP_FUNCTIONS = 40
+
+# Before 3.12 a cProfile.Profile only sees the thread that enabled it, so
+# each thread needs its own. From 3.12 it is built on sys.monitoring: it sees
+# every thread, and enabling a second one fails while the first is on.
+PER_THREAD = sys.version_info < (3, 12)
+
+logger = logging.getLogger(__name__)
+
+_active: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+
+
+def authorized(token: str | None) -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or "", ADMIN_TOKEN)
+
+
+def requested(headers, query_params) -> bool:
+    flag = query_params.get("profile") or headers.get(SWITCH_HEADER) or ""
+    return flag.lower() in ("1", "true", "yes")
+
+
+class Profile:
+    def __init__(self, request: str):
+        self.id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.request = request
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.seconds = 0.0
+        self.status = 0
+        self.spans: list[dict] = []
+        # Profilers that have been switched off, ready to merge
+        self._profilers: list[cProfile.Profile] = []
+        # Threads inside profile_thread, and the profiler each one enabled
+        self._threads: set[int] = set()
+        self._running: dict[int, cProfile.Profile] = {}
+        # PER_THREAD off: the process-wide profiler and how many threads use it
+        self._shared: cProfile.Profile | None = None
+        self._shared_users = 0
+        self._shared_failed = False
+        self._profiled_threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, kind: str, name: str, **fields):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            entry = {
+                "kind": kind,
+                "name": name,
+                "start": round(started - self._started, 4),
+                "seconds": round(ended - started, 4),
+                "thread": threading.current_thread().name,
+                **fields,
+            }
+            with self._lock:
+                self.spans.append(entry)
+
+    @contextmanager
+    def profile_thread(self):
+        """
+        Run cProfile on the calling thread until the block exits. If the
+        profiler can't be switched on or off the error is logged and the
+        block runs unprofiled.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            nested = ident in self._threads
+            self._threads.add(ident)
+        if nested:
+            yield
+            return
+        try:
+            started = self._start(ident)
+            try:
+                yield
+            finally:
+                if started:
+                    self._stop(ident)
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def _start(self, ident: int) -> bool:
+        with self._lock:
+            if PER_THREAD:
+                profiler = cProfile.Profile()
+                if not _switch(profiler, on=True):
+                    return False
+                self._running[ident] = profiler
+            elif self._shared_users:
+                self._shared_users += 1
+            elif self._shared_failed:
+                return False
+            else:
+                profiler = cProfile.Profile()
+                if not _switch(profiler, on=True):
+                    # Held by another request; don't retry on every thread
+                    self._shared_failed = True
+                    return False
+                self._shared = profiler
+                self._shared_users = 1
+            self._profiled_threads.add(ident)
+        return True
+
+    def _stop(self, ident: int) -> None:
+        with self._lock:
+            if PER_THREAD:
+                profiler = self._running.pop(ident)
+            else:
+                self._shared_users -= 1
+                if self._shared_users:
+                    return
+                profiler, self._shared = self._shared, None
+            if _switch(profiler, on=False):
+                self._profilers.append(profiler)
+
+    def finish(self, status: int) -> None:
+        self.seconds = round(time.perf_counter() - self._started, 4)
+        self.status = status
+
+    def breakdown(self) -> list[dict]:
+        """Total time, call count and longest call per span, slowest first"""
+        totals: dict[tuple[str, str], dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(
+                (span["kind"], span["name"]),
+                {"kind": span["kind"], "name": span["name"], "seconds": 0.0},
+            )
+            entry["seconds"] = round(entry["seconds"] + span["seconds"], 4)
+            entry["calls"] = entry.get("calls", 0) + 1
+            entry["max_seconds"] = max(entry.get("max_seconds", 0), span["seconds"])
+        return sorted(totals.values(), key=lambda e: e["seconds"], reverse=True)
+
+    def stats(self) -> pstats.Stats | None:
+        """The finished profiles merged; threads still running are left out"""
+        with self._lock:
+            profilers = list(self._profilers)
+        if not profilers:
+            return None
+        return pstats.Stats(*profilers)
+
+    def save(self, directory: Path = PROFILES_DIR) -> None:
+        # Imported here: storage imports metrics, which imports this module
+        import storage
+
+        stats = self.stats()
+        top = ""
+        if stats is not None:
+            # What Stats.dump_stats writes, but atomically
+            storage.atomic_write_bytes(
+                directory / f"{self.id}.prof", marshal.dumps(stats.stats)
+            )
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            top = out.getvalue()
+
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        entry = {
+            "id": self.id,
+            "request": self.request,
+            "status": self.status,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "threads": len(self._profiled_threads),
+            "cpu_profile": stats is not None,
+            "breakdown": self.breakdown(),
+            "spans": spans,
+            "top_functions": top,
+        }
+        storage.atomic_write_bytes(
+            directory / f"{self.id}.json", json.dumps(entry, indent=2).encode("utf-8")
+        )
+        prune(directory)
+
+
+def _switch(profiler: cProfile.Profile, on: bool) -> bool:
+    """Enable or disable `profiler`; False, logged, if that raised"""
+    try:
+        if on:
+            profiler.enable()
+        else:
+            profiler.disable()
+    except Exception as e:
+        # e.g. "Another profiling tool is already active" on 3.12+
+        logger.warning("Could not %s cProfile: %s", "enable" if on else "disable", e)
+        return False
+    return True
+
+
+def prune(directory: Path = PROFILES_DIR, keep: int = PROFILES_KEEP) -> None:
+    """Delete all but the newest `keep` profiles (ids sort by time)"""
+    ids = sorted(path.name.split(".")[0] for path in directory.glob("*.json"))
+    for profile_id in ids[: max(0, len(ids) - keep)]:
+        for path in directory.glob(f"{profile_id}.*"):
+            path.unlink(missing_ok=True)
+
+
+def load(profile_id: str, directory: Path = PROFILES_DIR) -> dict | None:
+    path = directory / f"{Path(profile_id).name}.json"
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pstats_path(profile_id: str, directory: Path = PROFILES_DIR) -> Path | None:
+    path = directory / f"{Path(profile_id).name}.prof"
+    return path if path.is_file() else None
+
+
+# ---------------------------------------
+# Hooks
+# ---------------------------------------
+@contextmanager
+def span(kind: str, name: str, **fields):
+    """Record a span in the current request's profile; a no-op when not profiling"""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    with profile.span(kind, name, **fields):
+        yield
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    Profile the thread running `fn` when its request is profiled. For sync
+    endpoints; keeps `fn`'s signature so FastAPI still sees its parameters.
+    """
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        profile = _active.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        with profile.profile_thread():
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def wrap(fn: Callable) -> Callable:
+    """
+    `fn` carrying the caller's profile into a pool thread, e.g.
+    `pool.submit(profiling.wrap(fn), ...)`. Returns `fn` itself when the
+    caller isn't being profiled.
+    """
+    profile = _active.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _active.set(profile)
+        try:
+            with profile.profile_thread():
+                return fn(*args, **kwargs)
+        finally:
+            _active.reset(token)
+
+    return run
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests that ask for it. Requests
+    without the switch pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        from starlette.datastructures import Headers, MutableHeaders, QueryParams
+        from starlette.responses import JSONResponse
+
+        if scope["type"] != "http" or not ADMIN_TOKEN:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if not requested(headers, QueryParams(scope["query_string"])):
+            return await self.app(scope, receive, send)
+        if not authorized(headers.get(TOKEN_HEADER)):
+            response = JSONResponse(
+                {"detail": "Profiling requires a valid admin token"}, status_code=403
+            )
+            return await response(scope, receive, send)
+
+        profile = Profile(f"{scope['method']} {scope['path']}")
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(ID_HEADER, profile.id)
+            await send(message)
+
+        token = _active.set(profile)
+        try:
+            with profile.span("request", profile.request):
+                await self.app(scope, receive, send_with_id)
+        finally:
+            _active.reset(token)
+            profile.finish(status)
+            try:
+                await asyncio.to_thread(profile.save)
+            except OSError as e:
+                logger.warning("Could not save profile %s: %s", profile.id, e)
@@ -0,0 +1,35 @@
+"""
+Progress reporting for the generation workflows.
+
+Callers pass an `on_progress` callback through the LangGraph run config:
+
+    app.invoke(state, config={"configurable": {"on_progress": callback}})
+
+and nodes call `emit(config, ...)` to report what they just did. Without a
+callback emitting is a no-op, so the CLI entry points are unaffected.
+"""
+
+import logging
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[dict], None]
+
+
+def run_config(on_progress: ProgressCallback | None) -> dict:
+    return {"configurable": {"on_progress": on_progress}}
+
+
+def emit(config: dict | None, **event: Any) -> None:
+    callback = ((config or {}).get("configurable") or {}).get("on_progress")
+    if callback is None:
+        return
+
+    event.setdefault("timestamp", time.time())
+    try:
+        callback(event)
+    except Exception as e:
+        # A broken listener must never fail the generation itself
+        logger.warning("Progress callback failed: %s", e)
@@ -0,0 +1,381 @@
+"""
+Quota-aware rate limiting and retries for Gemini calls.
+
+Every Gemini call goes through `call(model, fn, ...)`, which:
+  • waits for a slot in that model's requests-per-minute and concurrency budget
+  • retries 429 / 5xx / network failures with exponential backoff and jitter
+  • honours Retry-After (header or RetryInfo detail) and pauses the whole model
+    for that long, so concurrent callers back off together instead of piling on
+
+Budgets default to DEFAULT_LIMITS and can be overridden with GEMINI_RATE_LIMITS:
+    GEMINI_RATE_LIMITS='{"gemini-2.5-flash-image": {"rpm": 30, "concurrency": 4}}'
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    "gemini-2.5-flash-image": {"rpm": 60, "concurrency": 8},
+    "gemini-3-pro-image-preview": {"rpm": 20, "concurrency": 4},
+    "gemini-3-flash-preview": {"rpm": 120, "concurrency": 16},
+}
+FALLBACK_LIMIT = {"rpm": 60, "concurrency": 8}
+
+MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ModelLimiter:
+    """Requests-per-minute and concurrency budget for one model"""
+
+    def __init__(self, model: str, rpm: int, concurrency: int):
+        self.model = model
+        self.rpm = rpm
+        self.concurrency = concurrency
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self._starts: deque[float] = deque()
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        # Futures of async callers waiting for a release, on their own loops
+        self._waiters: set[asyncio.Future] = set()
+
+    @contextmanager
+    def slot(self):
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        await self._async_acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller of this model for `seconds`"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def saturated(self) -> bool:
+        """True while a new call would have to wait: paused, rpm used up or queued"""
+        with self._cond:
+            now = time.monotonic()
+            self._expire(now)
+            return (
+                now < self._blocked_until
+                or len(self._starts) >= self.rpm
+                or self.waiting > 0
+            )
+
+    def record(self, counter: str) -> None:
+        with self._cond:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._expire(time.monotonic())
+            return {
+                "rpm": self.rpm,
+                "concurrency": self.concurrency,
+                "waiting": self.waiting,
+                "in_flight": self.in_flight,
+                "calls_last_minute": len(self._starts),
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "paused_for": round(
+                    max(0.0, self._blocked_until - time.monotonic()), 3
+                ),
+            }
+
+    def _expire(self, now: float) -> None:
+        while self._starts and now - self._starts[0] >= 60:
+            self._starts.popleft()
+
+    def _try_start(self) -> tuple[bool, float | None]:
+        """
+        Take a slot if a call may start now (with the lock held). Otherwise
+        how long to wait before trying again; None means until a release.
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        timeouts = []
+        if len(self._starts) >= self.rpm:
+            timeouts.append(60 - (now - self._starts[0]))
+        if now < self._blocked_until:
+            timeouts.append(self._blocked_until - now)
+
+        if self.in_flight < self.concurrency and not timeouts:
+            self.in_flight += 1
+            self.calls += 1
+            self._starts.append(now)
+            return True, None
+        return False, max(timeouts) if timeouts else None
+
+    def _acquire(self) -> None:
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    started, timeout = self._try_start()
+                    if started:
+                        return
+                    # A release notifies us; time-based limits wake us up themselves
+                    self._cond.wait(timeout=timeout)
+            finally:
+                self.waiting -= 1
+
+    async def _async_acquire(self) -> None:
+        """_acquire for the event loop: waits on a future, not a worker thread"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            self.waiting += 1
+        try:
+            while True:
+                waiter = loop.create_future()
+                with self._cond:
+                    started, timeout = self._try_start()
+                    if started:
+                        return
+                    self._waiters.add(waiter)
+                try:
+                    await asyncio.wait_for(waiter, timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        self._waiters.discard(waiter)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def _release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+            for waiter in self._waiters:
+                try:
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                except RuntimeError:
+                    # Its event loop has been closed
+                    pass
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _load_limits() -> dict:
+    limits = {model: dict(limit) for model, limit in DEFAULT_LIMITS.items()}
+    overrides = os.getenv("GEMINI_RATE_LIMITS")
+    if overrides:
+        for model, limit in json.loads(overrides).items():
+            limits[model] = {**limits.get(model, FALLBACK_LIMIT), **limit}
+    return limits
+
+
+_limits = _load_limits()
+_limiters: dict[str, ModelLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str) -> ModelLimiter:
+    with _limiters_lock:
+        if model not in _limiters:
+            limit = _limits.get(model, FALLBACK_LIMIT)
+            _limiters[model] = ModelLimiter(model, limit["rpm"], limit["concurrency"])
+        return _limiters[model]
+
+
+def stats() -> dict:
+    """Per-model queue depth, in-flight calls and retry counters"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model: limiter.stats() for limiter in limiters}
+
+
+# ---------------------------------------
+# Error classification
+# ---------------------------------------
+def status_code(error: Exception) -> int | None:
+    # google.genai.errors.APIError carries the HTTP status as `code`
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # Transport errors from the HTTP client used by google.genai
+    return type(error).__module__.startswith(("httpx", "httpcore"))
+
+
+def retry_after(error: Exception) -> float | None:
+    """Server-requested delay from a Retry-After header or a RetryInfo detail"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+            return max(0.0, parsed.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    details = getattr(error, "details", None)
+    match = re.search(r"retryDelay['\"]?\s*:\s*['\"]([\d.]+)s", str(details or ""))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with equal jitter (attempt counts from 0)"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# ---------------------------------------
+# Per-caller tallies
+# ---------------------------------------
+class Tally:
+    """Call attempts, retries included, per model"""
+
+    def __init__(self):
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str) -> None:
+        with self._lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+
+
+_tally: ContextVar[Tally | None] = ContextVar("tally", default=None)
+
+
+@contextmanager
+def tally():
+    """
+    Count the attempts made inside the block (and in pool threads started
+    from it with the context copied), not other callers' calls that overlap it
+    """
+    counter = Tally()
+    token = _tally.set(counter)
+    try:
+        yield counter
+    finally:
+        _tally.reset(token)
+
+
+# ---------------------------------------
+# Entry point
+# ---------------------------------------
+@contextmanager
+def _timed(model: str):
+    """Record one call attempt (not the wait for its slot) in GEMINI_SECONDS"""
+    counter = _tally.get()
+    if counter is not None:
+        counter.add(model)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with profiling.span("gemini", model):
+            yield
+        outcome = "ok"
+    finally:
+        metrics.GEMINI_SECONDS.observe(
+            time.perf_counter() - started, model=model, outcome=outcome
+        )
+
+
+def call(model: str, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+    """Run `fn(*args, **kwargs)` within `model`'s budget, retrying transient errors"""
+    limiter = limiter_for(model)
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with limiter.slot(), _timed(model):
+                return fn(*args, **kwargs)
+        except Exception as e:
+            time.sleep(_retry_delay(model, limiter, e, attempt))
+
+
+async def acall(
+    model: str, fn: Callable[..., Awaitable[Any]], /, *args: Any, **kwargs: Any
+) -> Any:
+    """Async `call`: awaits `fn(*args, **kwargs)`, e.g. a method of client.aio"""
+    limiter = limiter_for(model)
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            async with limiter.async_slot():
+                with _timed(model):
+                    return await fn(*args, **kwargs)
+        except Exception as e:
+            await asyncio.sleep(_retry_delay(model, limiter, e, attempt))
+
+
+def _retry_delay(
+    model: str, limiter: ModelLimiter, error: Exception, attempt: int
+) -> float:
+    """How long to wait before retrying `error`; re-raises it if it is final"""
+    if not is_retryable(error) or attempt == MAX_ATTEMPTS - 1:
+        limiter.record("failures")
+        raise error
+
+    delay = backoff_delay(attempt)
+    server_delay = retry_after(error)
+    if status_code(error) == 429:
+        limiter.record("throttled")
+        if server_delay is not None:
+            limiter.pause(server_delay)
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+
+    limiter.record("retries")
+    logger.warning(
+        "%s call failed (%s); retry %d/%d in %.1fs",
+        model,
+        error,
+        attempt + 1,
+        MAX_ATTEMPTS - 1,
+        delay,
+        extra={"model": model, "attempt": attempt + 1},
+    )
+    return delay
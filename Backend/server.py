@@ -1,20 +1,141 @@
 # server.py (or app.py - whichever you're using)
+import time
+
+_import_started = time.perf_counter()
+
 import os
-from fastapi import FastAPI, Query, HTTPException, Body
-from fastapi.staticfiles import StaticFiles
+import json
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, Query, HTTPException, Body, Header
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from main import generate_asset_progression
+from main import generate_asset_progression, generate_asset_progressions
 from survey_landscape import generate_survey_landscape
+from jobs import JobManager
+from demand import DemandTracker
 from typing import Any, List, Dict
 from pydantic import BaseModel
-import requests
-from google import genai
+import gemini
+import logs
+import main
+import metrics
+import precompute
+import profiling
+import rate_limit
+from static_assets import (
+    BLOBS_URL,
+    ImmutableStaticFiles,
+    NegotiatedStaticFiles,
+    derivative_urls,
+    hashed_url,
+)
+import storage
+import survey_landscape
+
+logs.setup()
+logger = logging.getLogger(__name__)
+
+# Time spent importing this module; heavy libraries (langgraph, google.genai)
+# are deferred to warm-up and PIL and numpy to first use, so this stays small.
+# For a per-module breakdown: python -X importtime -c "import server"
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+def process_age() -> float | None:
+    """Seconds since this process started, from /proc (Linux); None elsewhere"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Field 22, counted after the parenthesised command name
+            started = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+
+
+# Also counts interpreter startup and what the launcher (e.g. uvicorn)
+# imported before this module, which IMPORT_SECONDS can't see
+PROCESS_SECONDS = process_age()
+
+# Set WARM_UP=0 to skip precompiling workflows and creating the client at startup
+WARM_UP = os.getenv("WARM_UP", "1") != "0"
+
+# Size of the background pool that runs submitted generation jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Upper bound on how many things of one batch are generated at the same time
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+BATCH_MAX_THINGS = 50
+# How often an event stream checks its job for new progress
+STREAM_POLL_SECONDS = 0.25
+jobs = JobManager(max_workers=JOB_WORKERS)
+demand_tracker = DemandTracker()
+
+
+def generation_idle() -> bool:
+    """No job waiting or running and no image call in flight"""
+    job_counts = jobs.stats()
+    image = rate_limit.limiter_for(main.IMAGE_MODEL).stats()
+    busy = job_counts["queued"] + job_counts["running"]
+    return busy == 0 and image["in_flight"] + image["waiting"] == 0
+
+
+precomputer = precompute.Precomputer(demand_tracker, is_idle=generation_idle)
+
+
+startup_report: dict = {
+    "import_seconds": round(IMPORT_SECONDS, 3),
+    "process_seconds": None if PROCESS_SECONDS is None else round(PROCESS_SECONDS, 3),
+}
+
+
+def warm_up() -> dict:
+    """
+    Do the expensive one-off work before the first request: import langgraph
+    and compile both workflows and create the Gemini client. Returns how
+    long each step took.
+    """
+    steps = {
+        "progression_workflow": main.get_workflow,
+        "landscape_workflow": survey_landscape.get_workflow,
+        "gemini_client": gemini.get_client,
+    }
+    report = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            report[f"{name}_error"] = str(e)
+        report[name] = round(time.perf_counter() - started, 3)
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if WARM_UP:
+        startup_report["warm_up"] = await asyncio.to_thread(warm_up)
+    startup_report["startup_seconds"] = round(time.perf_counter() - started, 3)
+    loaded = PROCESS_SECONDS if PROCESS_SECONDS is not None else IMPORT_SECONDS
+    startup_report["ready_seconds"] = round(
+        loaded + startup_report["startup_seconds"], 3
+    )
+    logger.info("Server ready", extra=startup_report)
+    if precompute.ENABLED:
+        precomputer.start()
+    yield
+    precomputer.stop()
+    demand_tracker.flush()
+    jobs.shutdown()
+    await gemini.close_client()
 
-# Load your GEMINI_API_KEY from environment
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CRITICAL: Add CORS middleware BEFORE mounting static files
 app.add_middleware(
@@ -24,46 +145,88 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Admins can profile single requests (?profile=1 with X-Admin-Token)
+app.add_middleware(profiling.ProfilingMiddleware)
 
 # Create assets directory if it doesn't exist
 os.makedirs("assets", exist_ok=True)
+os.makedirs(storage.BLOBS_DIR, exist_ok=True)
 
-# Mount the assets directory
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
-
-
-@app.get("/")
-def root():
-    return {"message": "ok"}
+# Mount the assets directory; PNGs are answered with WebP/AVIF when accepted
+app.mount("/assets", NegotiatedStaticFiles(directory="assets"), name="assets")
+# Content-hashed copies of the same files, cacheable forever
+app.mount(
+    BLOBS_URL, ImmutableStaticFiles(directory=storage.BLOBS_DIR), name="blobs"
+)
 
 
-@app.get("/generate")
-def generate(thing: str = Query(...)):
-    """Generate progressive asset images (1-5 stages) for a single thing"""
-    result = generate_asset_progression(thing)
-    if result["error"]:
-        raise HTTPException(status_code=500, detail=result["error"])
+def progression_response(thing: str, result: dict) -> dict:
     return {
         "thing": thing,
+        "mode": result["mode"],
         "image_paths": result["image_paths"],
+        "image_urls": [hashed_url(path) for path in result["image_paths"]],
+        "derivatives": [derivative_urls(paths) for paths in result["derivatives"]],
         "output_dir": result["output_dir"],
+        "cached": result["cached"],
+        "quality": result.get("quality", {}),
         "message": "Generation complete",
     }
 
 
-@app.post("/generate-landscape")
-def generate_landscape(survey_answers: List[Dict[str, Any]] = Body(...)):
-    """
-    Generate a composite landscape from survey answers.
+def landscape_response(survey_answers: List[Dict[str, Any]], result: dict) -> dict:
+    return {
+        "survey_answers": survey_answers,
+        "final_image_path": result["final_image_path"],
+        "final_image_url": hashed_url(result["final_image_path"]),
+        "final_derivatives": derivative_urls(result["final_derivatives"]),
+        "aspect_ratio": result["aspect_ratio"],
+        "resolution": result["resolution"],
+        "tiled": result.get("tiled", False),
+        "output_dir": result["output_dir"],
+        "element_count": len(result["element_prompts"]),
+        "cached": result["cached"],
+        "message": "Landscape generation complete",
+    }
 
-    Expected format:
-    [
-        {"category": "dog", "score": 1},
-        {"category": "sky", "score": 5},
-        {"category": "tree", "score": 3}
-    ]
-    """
-    # Validate input
+
+def preview_response(
+    survey_answers: List[Dict[str, Any]], result: dict, ai_skipped: bool = False
+) -> dict:
+    return {
+        "survey_answers": survey_answers,
+        "preview_image_path": result["image_path"],
+        "preview_image_url": hashed_url(result["image_path"]),
+        "missing": result["missing"],
+        "seconds": result["seconds"],
+        "ai_skipped": ai_skipped,
+        "message": "Preview landscape composited from cached stage images",
+    }
+
+
+def validate_mode(mode: str) -> str:
+    if mode not in main.PROGRESSION_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"mode must be one of {', '.join(main.PROGRESSION_MODES)}, got {mode}",
+        )
+    return mode
+
+
+def validate_landscape_options(aspect_ratio: str, resolution: str) -> None:
+    if aspect_ratio not in survey_landscape.ASPECT_RATIOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"aspect_ratio must be one of {', '.join(survey_landscape.ASPECT_RATIOS)}",
+        )
+    if resolution not in survey_landscape.RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"resolution must be one of {', '.join(survey_landscape.RESOLUTIONS)}",
+        )
+
+
+def validate_survey_answers(survey_answers: List[Dict[str, Any]]) -> None:
     if not survey_answers:
         raise HTTPException(status_code=400, detail="Survey answers cannot be empty")
 
@@ -79,26 +242,513 @@ def generate_landscape(survey_answers: List[Dict[str, Any]] = Body(...)):
                 detail=f"Score must be an integer between 1-5, got {item['score']}",
             )
 
+
+@app.get("/")
+async def root():
+    return {"message": "ok"}
+
+
+@app.get("/limits")
+async def limits():
+    """Per-model Gemini budget usage: queue depth, in-flight calls, retries"""
+    return rate_limit.stats()
+
+
+@app.get("/inflight")
+async def inflight():
+    """How many generation calls ran and how many joined an identical running one"""
+    return {
+        "progression": main.inflight.stats(),
+        "landscape": survey_landscape.inflight.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Node and Gemini latency histograms and workflow counters, for Prometheus"""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/demand")
+async def demand(top: int = Query(20, ge=1, le=200)):
+    """Most requested things and the state of off-peak precomputation"""
+    return {"top": demand_tracker.top(top), "precompute": precomputer.status()}
+
+
+def require_admin(token: str | None) -> None:
+    if not profiling.authorized(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/profiles/{profile_id}")
+async def profile_report(profile_id: str, x_admin_token: str | None = Header(None)):
+    """Span breakdown per workflow node and Gemini call, plus the slowest functions"""
+    require_admin(x_admin_token)
+    report = await asyncio.to_thread(profiling.load, profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile {profile_id}")
+    return report
+
+
+@app.get("/profiles/{profile_id}/pstats")
+async def profile_pstats(profile_id: str, x_admin_token: str | None = Header(None)):
+    """The raw cProfile data, for pstats or snakeviz"""
+    require_admin(x_admin_token)
+    path = profiling.pstats_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No CPU profile {profile_id}")
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"{profile_id}.prof",
+    )
+
+
+@app.get("/startup")
+async def startup():
+    """Import and warm-up timings, for tracking readiness latency"""
+    return startup_report
+
+
+@app.get("/generate")
+@profiling.profiled
+def generate(
+    thing: str = Query(...),
+    refresh: bool = Query(False),
+    mode: str = Query(main.SEQUENTIAL),
+):
+    """
+    Generate progressive asset images (1-5 stages) for a single thing.
+    mode=fanout renders stages 2-5 concurrently from stage 1 (faster, less
+    consistent between stages).
+    """
+    mode = validate_mode(mode)
+    demand_tracker.record(main.normalize_thing(thing))
+    result = generate_asset_progression(thing, use_cache=not refresh, mode=mode)
+    if result["error"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return progression_response(thing, result)
+
+
+@app.post("/generate-landscape")
+@profiling.profiled
+def generate_landscape(
+    survey_answers: List[Dict[str, Any]] = Body(...),
+    refresh: bool = Query(False),
+    preview: bool = Query(False),
+    progressive: bool = Query(False),
+    aspect_ratio: str = Query(survey_landscape.ASPECT_RATIO),
+    resolution: str = Query(survey_landscape.RESOLUTION),
+):
+    """
+    Generate a composite landscape from survey answers. With preview=true,
+    return a local composite of the cached stage images instead (no Gemini
+    call, well under a second).
+
+    With progressive=true a 1K draft is returned as soon as it exists, along
+    with `upgrade_job_id`: a job that re-renders the draft at `resolution`
+    (poll /jobs/{id} or stream /jobs/{id}/events for the replacement).
+
+    Expected format:
+    [
+        {"category": "dog", "score": 1},
+        {"category": "sky", "score": 5},
+        {"category": "tree", "score": 3}
+    ]
+    """
+    validate_survey_answers(survey_answers)
+    validate_landscape_options(aspect_ratio, resolution)
+
+    if preview:
+        return preview_response(
+            survey_answers, survey_landscape.render_landscape_preview(survey_answers)
+        )
+
+    if progressive and needs_draft(survey_answers, refresh, aspect_ratio, resolution):
+        draft = generate_survey_landscape(
+            survey_answers,
+            use_cache=not refresh,
+            aspect_ratio=aspect_ratio,
+            resolution=survey_landscape.DRAFT_RESOLUTION,
+        )
+        if draft["error"]:
+            raise HTTPException(status_code=500, detail=draft["error"])
+        response = landscape_response(survey_answers, draft)
+        response["upgrade_job_id"] = None
+        response["upgrade_skipped"] = survey_landscape.quota_tight()
+        if not response["upgrade_skipped"]:
+            job = jobs.submit(
+                "upgrade-landscape",
+                partial(
+                    run_upgrade_job,
+                    survey_answers,
+                    refresh,
+                    aspect_ratio,
+                    resolution,
+                    draft["final_image_path"],
+                ),
+                {"survey_answers": survey_answers, "resolution": resolution},
+            )
+            response["upgrade_job_id"] = job.id
+        return response
+
     # Generate the landscape
-    result = generate_survey_landscape(survey_answers)
+    result = generate_survey_landscape(
+        survey_answers,
+        use_cache=not refresh,
+        aspect_ratio=aspect_ratio,
+        resolution=resolution,
+    )
 
     if result["error"]:
         raise HTTPException(status_code=500, detail=result["error"])
 
-    return {
-        "survey_answers": survey_answers,
-        "final_image_path": result["final_image_path"],
-        "output_dir": result["output_dir"],
-        "element_count": len(result["element_prompts"]),
-        "message": "Landscape generation complete",
-    }
+    return landscape_response(survey_answers, result)
+
+
+# ---------------------------------------
+# Background jobs (submit and poll)
+# ---------------------------------------
+def run_progression_job(
+    thing: str, refresh: bool, mode: str, on_progress=None
+) -> dict:
+    result = generate_asset_progression(
+        thing, use_cache=not refresh, on_progress=on_progress, mode=mode
+    )
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return progression_response(thing, result)
+
+
+def needs_draft(
+    survey_answers: List[Dict[str, Any]],
+    refresh: bool,
+    aspect_ratio: str,
+    resolution: str,
+) -> bool:
+    """Progressive mode drafts unless the requested render is the draft or cached"""
+    if resolution == survey_landscape.DRAFT_RESOLUTION:
+        return False
+    cached = survey_landscape.load_cached_landscape(
+        survey_answers, aspect_ratio, resolution
+    )
+    return refresh or cached is None
+
+
+def run_upgrade_job(
+    survey_answers: List[Dict[str, Any]],
+    refresh: bool,
+    aspect_ratio: str,
+    resolution: str,
+    draft_image_path: str,
+    on_progress=None,
+) -> dict:
+    result = generate_survey_landscape(
+        survey_answers,
+        use_cache=not refresh,
+        on_progress=on_progress,
+        aspect_ratio=aspect_ratio,
+        resolution=resolution,
+        draft_image_path=draft_image_path,
+    )
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    return landscape_response(survey_answers, result)
+
+
+def run_landscape_job(
+    survey_answers: List[Dict[str, Any]],
+    refresh: bool,
+    preview: bool = False,
+    progressive: bool = False,
+    aspect_ratio: str = survey_landscape.ASPECT_RATIO,
+    resolution: str = survey_landscape.RESOLUTION,
+    on_progress=None,
+) -> dict:
+    # A cached AI landscape is as fast as a preview, so only preview misses
+    if preview and (
+        refresh or survey_landscape.load_cached_landscape(survey_answers) is None
+    ):
+        shown = survey_landscape.render_landscape_preview(survey_answers)
+        if on_progress:
+            on_progress(
+                {
+                    "phase": "preview",
+                    "status": "saved",
+                    "image_path": shown["image_path"],
+                    "missing": shown["missing"],
+                    "timestamp": time.time(),
+                }
+            )
+        if survey_landscape.quota_tight():
+            logger.info("Landscape model is at its budget; returning the preview only")
+            return preview_response(survey_answers, shown, ai_skipped=True)
+
+    draft_image_path = ""
+    if progressive and needs_draft(survey_answers, refresh, aspect_ratio, resolution):
+        draft = generate_survey_landscape(
+            survey_answers,
+            use_cache=not refresh,
+            on_progress=on_progress,
+            aspect_ratio=aspect_ratio,
+            resolution=survey_landscape.DRAFT_RESOLUTION,
+        )
+        if draft["error"]:
+            raise RuntimeError(draft["error"])
+        drafted = landscape_response(survey_answers, draft)
+        if on_progress:
+            on_progress(
+                {
+                    "phase": "draft",
+                    "status": "ready",
+                    "image_path": draft["final_image_path"],
+                    "result": drafted,
+                    "timestamp": time.time(),
+                }
+            )
+        if survey_landscape.quota_tight():
+            logger.info("Landscape model is at its budget; keeping the draft")
+            return {**drafted, "upgrade_skipped": True}
+        draft_image_path = draft["final_image_path"]
+
+    return run_upgrade_job(
+        survey_answers,
+        refresh,
+        aspect_ratio,
+        resolution,
+        draft_image_path,
+        on_progress=on_progress,
+    )
+
+
+@app.post("/jobs/generate", status_code=202)
+async def submit_generate(
+    thing: str = Query(...),
+    refresh: bool = Query(False),
+    mode: str = Query(main.SEQUENTIAL),
+):
+    """Queue a progression for `thing` and return its job id immediately"""
+    mode = validate_mode(mode)
+    demand_tracker.record(main.normalize_thing(thing))
+    job = jobs.submit(
+        "generate",
+        partial(run_progression_job, thing, refresh, mode),
+        {"thing": thing, "mode": mode},
+    )
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.post("/jobs/generate-landscape", status_code=202)
+async def submit_generate_landscape(
+    survey_answers: List[Dict[str, Any]] = Body(...),
+    refresh: bool = Query(False),
+    preview: bool = Query(False),
+    progressive: bool = Query(False),
+    aspect_ratio: str = Query(survey_landscape.ASPECT_RATIO),
+    resolution: str = Query(survey_landscape.RESOLUTION),
+):
+    """
+    Queue a landscape for the given survey answers and return its job id.
+    With preview=true a local composite is reported first (a `preview`
+    progress event); the AI landscape follows unless the landscape model is
+    at its budget, in which case the preview is the result.
+
+    With progressive=true a 1K draft is reported first (a `draft` progress
+    event carrying its result), then re-rendered at `resolution`, which
+    becomes the job's result.
+    """
+    validate_survey_answers(survey_answers)
+    validate_landscape_options(aspect_ratio, resolution)
+    job = jobs.submit(
+        "generate-landscape",
+        partial(
+            run_landscape_job,
+            survey_answers,
+            refresh,
+            preview,
+            progressive,
+            aspect_ratio,
+            resolution,
+        ),
+        {
+            "survey_answers": survey_answers,
+            "aspect_ratio": aspect_ratio,
+            "resolution": resolution,
+            "progressive": progressive,
+        },
+    )
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status, latest stage/element progress and, once done, the result"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+
+# ---------------------------------------
+# Server-Sent Events
+# ---------------------------------------
+def sse_message(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_job_events(job):
+    """
+    Yield every progress event of `job` as it happens, then a final
+    `done` or `error` event. Saved images carry a content-hashed
+    `asset_url` so the client can show each stage as soon as it exists.
+    """
+    sent = 0
+    while True:
+        finished = job.done
+        for event in job.events_since(sent):
+            sent += 1
+            if "image_path" in event:
+                url = await asyncio.to_thread(hashed_url, event["image_path"])
+                event = {**event, "asset_url": url}
+            yield sse_message("progress", event)
+
+        if finished:
+            if job.error:
+                yield sse_message("error", {"job_id": job.id, "detail": job.error})
+            else:
+                yield sse_message("done", {"job_id": job.id, "result": job.result})
+            return
+
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+
+
+def event_stream_response(job) -> StreamingResponse:
+    return StreamingResponse(
+        stream_job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream a job's progress as Server-Sent Events"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return event_stream_response(job)
+
+
+class BatchRequest(BaseModel):
+    things: List[str]
+    max_parallel: int | None = None
+    mode: str = main.SEQUENTIAL
+
+
+def validate_batch(req: BatchRequest) -> list[str]:
+    things = [thing.strip() for thing in req.things if thing.strip()]
+    if not things:
+        raise HTTPException(status_code=400, detail="things cannot be empty")
+    if len(things) > BATCH_MAX_THINGS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_THINGS} things per batch, got {len(things)}",
+        )
+    return things
+
+
+def run_batch_job(
+    things: list[str], max_parallel: int, refresh: bool, mode: str, on_progress=None
+) -> dict:
+    results = {}
+    for thing, result in generate_asset_progressions(
+        things,
+        max_parallel=max_parallel,
+        use_cache=not refresh,
+        on_progress=on_progress,
+        mode=mode,
+    ):
+        if result["error"]:
+            results[thing] = {"thing": thing, "error": result["error"]}
+        else:
+            results[thing] = progression_response(thing, result)
+
+        if on_progress:
+            on_progress(
+                {
+                    "status": "thing_done",
+                    "thing": thing,
+                    "completed": len(results),
+                    "total": len({main.normalize_thing(t) for t in things}),
+                    "result": results[thing],
+                }
+            )
+
+    failed = sum(1 for entry in results.values() if "error" in entry)
+    return {"results": results, "failed": failed}
+
+
+def submit_batch(req: BatchRequest, refresh: bool):
+    things = validate_batch(req)
+    mode = validate_mode(req.mode)
+    # Once per thing, however often the batch lists it
+    for thing in {main.normalize_thing(thing) for thing in things}:
+        demand_tracker.record(thing)
+    max_parallel = min(req.max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL)
+    return jobs.submit(
+        "generate-batch",
+        partial(run_batch_job, things, max(1, max_parallel), refresh, mode),
+        {"things": things, "max_parallel": max_parallel, "mode": mode},
+    )
+
+
+@app.post("/jobs/generate-batch", status_code=202)
+async def submit_generate_batch(req: BatchRequest, refresh: bool = Query(False)):
+    """Queue progressions for several things; poll /jobs/{job_id} for results"""
+    job = submit_batch(req, refresh)
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.post("/generate-batch")
+async def generate_batch(req: BatchRequest, refresh: bool = Query(False)):
+    """
+    Generate progressions for several things concurrently and stream the
+    results as Server-Sent Events: stage events tagged with their thing, a
+    `thing_done` event as each thing finishes, then the combined result.
+    """
+    return event_stream_response(submit_batch(req, refresh))
+
+
+@app.get("/generate/stream")
+async def generate_stream(
+    thing: str = Query(...),
+    refresh: bool = Query(False),
+    mode: str = Query(main.SEQUENTIAL),
+):
+    """
+    Start a progression and stream each stage (asset URL, prompt, timing)
+    as soon as it is saved. Usable directly from an EventSource.
+    """
+    mode = validate_mode(mode)
+    demand_tracker.record(main.normalize_thing(thing))
+    job = jobs.submit(
+        "generate",
+        partial(run_progression_job, thing, refresh, mode),
+        {"thing": thing, "mode": mode},
+    )
+    return event_stream_response(job)
+
+PUN_MODEL = "gemini-3-flash-preview"
+
 
 class PunRequest(BaseModel):
     question: str
     theme: str
 
 @app.post("/generate-pun")
-def generate_pun(req: PunRequest):
+async def generate_pun(req: PunRequest):
     if not req.question or not req.theme:
         raise HTTPException(status_code=400, detail="Missing question or theme")
     try:
@@ -116,16 +766,18 @@ def generate_pun(req: PunRequest):
 
         Generate a pun-based survey question (1 sentence).
         """
-        response = client.models.generate_content(
-        model="gemini-3-flash-preview",
-        contents=prompt
+        response = await rate_limit.acall(
+            PUN_MODEL,
+            gemini.get_async_client().models.generate_content,
+            model=PUN_MODEL,
+            contents=prompt,
         )
 
         pun_text = response.text
         return {"pun": pun_text}
 
     except Exception as e:
-        print("Gemini API error:", e)
+        logger.error("Gemini API error: %s", e, extra={"model": PUN_MODEL})
         raise HTTPException(status_code=500, detail="Failed to generate pun")
 
 if __name__ == "__main__":
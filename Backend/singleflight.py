@@ -0,0 +1,98 @@
+"""
+Single-flight coalescing of identical generation requests.
+
+When a survey goes live many clients ask for the same thing within seconds.
+The first caller for a key runs the workflow; every caller that arrives
+with the same key while it is still running waits for that run and gets
+its result (or its exception) instead of starting another one. Progress
+events of the shared run are passed on to every caller that is waiting.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Hashable
+import metrics
+import profiling
+import progress
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.listeners: list[progress.ProgressCallback] = []
+        self.lock = threading.Lock()
+
+    def report(self, event: dict) -> None:
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning("Progress listener failed: %s", e)
+
+
+class SingleFlight:
+    def __init__(self, name: str = "default"):
+        # Label of the coalesced_calls_total series, e.g. the workflow
+        self.name = name
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[progress.ProgressCallback], Any],
+        on_progress: progress.ProgressCallback | None = None,
+    ) -> Any:
+        """
+        `fn(report)` once per key at a time; `report` forwards its progress
+        events to the `on_progress` of every caller sharing the run.
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+                metrics.COALESCED_CALLS.inc(workflow=self.name)
+            if on_progress:
+                with flight.lock:
+                    flight.listeners.append(on_progress)
+
+        if not leader:
+            with profiling.span("coalesced", self.name):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(flight.report)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,145 @@
+"""
+Checks that a progression's stages really progress.
+
+The stage prompts ask for a strictly monotonic recovery (brighter, more
+saturated, warmer) with the composition of Stage 1 kept intact. Nothing in
+the model guarantees that, so after the five images are saved this module
+measures them all at once on a small NumPy stack:
+
+    luminance   mean Rec. 601 luma, 0..1
+    saturation  mean HSV saturation, 0..1
+    warmth      mean (R - B), -1..1
+    histogram   LUMA_BINS-bin luma histogram, normalised
+    ssim        structural similarity to Stage 1 (grayscale, box window)
+
+and reports the first stage that breaks a rule, so only that stage and the
+ones after it need to be regenerated.
+"""
+
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+# Images are compared at this size; structure survives, cost drops ~16x
+ANALYSIS_SIZE = 256
+LUMA_BINS = 16
+SSIM_WINDOW = 7
+
+# How far a stage may dip below the previous one before it counts as a
+# regression. Calibrated on the shipped progressions: warmth rises reliably,
+# while Stage 2 often trades a little saturation for lighter greys and the
+# final stage a little luminance for richer colour.
+MONOTONIC_TOLERANCE = {"luminance": 0.10, "saturation": 0.08, "warmth": 0.04}
+# Every stage must stay at least this structurally similar to Stage 1
+MIN_SSIM = 0.30
+
+_SSIM_C1 = 0.01**2
+_SSIM_C2 = 0.03**2
+
+
+def load_stack(paths: list[str | Path]) -> np.ndarray:
+    """(stages, ANALYSIS_SIZE, ANALYSIS_SIZE, 3) float32 RGB in 0..1"""
+    frames = []
+    for path in paths:
+        with Image.open(path) as img:
+            img = img.convert("RGB").resize(
+                (ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BILINEAR
+            )
+            frames.append(np.asarray(img, dtype=np.float32) / 255.0)
+    return np.stack(frames)
+
+
+def _box_mean(x: np.ndarray, size: int) -> np.ndarray:
+    """Mean over size x size windows on the last two axes ('valid' region)"""
+    c = np.cumsum(np.cumsum(x, axis=-2), axis=-1)
+    c = np.pad(c, [(0, 0)] * (x.ndim - 2) + [(1, 0), (1, 0)])
+    total = c[..., size:, size:] - c[..., :-size, size:] - c[..., size:, :-size]
+    total = total + c[..., :-size, :-size]
+    return total / (size * size)
+
+
+def ssim_to_first(luma: np.ndarray) -> np.ndarray:
+    """Mean SSIM of every frame in (stages, H, W) against frame 0"""
+    ref = np.broadcast_to(luma[:1], luma.shape)
+    mu_x, mu_y = _box_mean(ref, SSIM_WINDOW), _box_mean(luma, SSIM_WINDOW)
+    var_x = _box_mean(ref * ref, SSIM_WINDOW) - mu_x**2
+    var_y = _box_mean(luma * luma, SSIM_WINDOW) - mu_y**2
+    cov = _box_mean(ref * luma, SSIM_WINDOW) - mu_x * mu_y
+
+    ssim = ((2 * mu_x * mu_y + _SSIM_C1) * (2 * cov + _SSIM_C2)) / (
+        (mu_x**2 + mu_y**2 + _SSIM_C1) * (var_x + var_y + _SSIM_C2)
+    )
+    return ssim.mean(axis=(-2, -1))
+
+
+def stage_metrics(stack: np.ndarray) -> list[dict]:
+    """Per-stage metrics for a (stages, H, W, 3) stack, computed in one pass"""
+    r, g, b = stack[..., 0], stack[..., 1], stack[..., 2]
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+
+    high, low = stack.max(axis=-1), stack.min(axis=-1)
+    saturation = np.where(high > 0, (high - low) / np.maximum(high, 1e-6), 0.0)
+
+    stages = stack.shape[0]
+    bins = np.minimum((luma * LUMA_BINS).astype(np.int64), LUMA_BINS - 1)
+    offsets = np.arange(stages)[:, None, None] * LUMA_BINS
+    counts = np.bincount((bins + offsets).ravel(), minlength=stages * LUMA_BINS)
+    histograms = counts.reshape(stages, LUMA_BINS) / bins[0].size
+
+    luminance = luma.mean(axis=(1, 2))
+    mean_saturation = saturation.mean(axis=(1, 2))
+    warmth = (r - b).mean(axis=(1, 2))
+    ssim = ssim_to_first(luma)
+
+    return [
+        {
+            "stage": i + 1,
+            "luminance": round(float(luminance[i]), 4),
+            "saturation": round(float(mean_saturation[i]), 4),
+            "warmth": round(float(warmth[i]), 4),
+            "ssim": round(float(ssim[i]), 4),
+            "histogram": [round(float(v), 4) for v in histograms[i]],
+        }
+        for i in range(stages)
+    ]
+
+
+def violations(metrics: list[dict]) -> list[dict]:
+    """Every broken rule, as {"stage", "rule", "value", "limit"}"""
+    found = []
+    for prev, cur in zip(metrics, metrics[1:]):
+        for name, tolerance in MONOTONIC_TOLERANCE.items():
+            limit = prev[name] - tolerance
+            if cur[name] < limit:
+                found.append(
+                    {
+                        "stage": cur["stage"],
+                        "rule": f"monotonic_{name}",
+                        "value": cur[name],
+                        "limit": round(limit, 4),
+                    }
+                )
+        if cur["ssim"] < MIN_SSIM:
+            found.append(
+                {
+                    "stage": cur["stage"],
+                    "rule": "structure",
+                    "value": cur["ssim"],
+                    "limit": MIN_SSIM,
+                }
+            )
+    return found
+
+
+def validate(paths: list[str | Path]) -> dict:
+    """
+    Metrics and violations for the saved stage images at `paths`, plus
+    `first_bad_stage` (None when the progression is fine).
+    """
+    metrics = stage_metrics(load_stack(paths))
+    found = violations(metrics)
+    return {
+        "metrics": metrics,
+        "violations": found,
+        "first_bad_stage": min((v["stage"] for v in found), default=None),
+    }
@@ -0,0 +1,94 @@
+"""
+Serving generated assets over HTTP.
+
+Two mounts:
+    /assets  stable names (assets/tree/tree_3.png) that get overwritten by
+             newer runs, so clients must revalidate them
+    /blobs   content-hashed copies (/blobs/3fa9….png) whose bytes never
+             change: strong ETag, cached for a year as immutable
+
+API responses hand out /blobs URLs; /assets stays for clients that build
+paths themselves.
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+import derivatives
+import storage
+
+BLOBS_URL = "/blobs"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+@lru_cache(maxsize=4096)
+def _blob_url(path: str, mtime_ns: int, size: int) -> str:
+    # Keyed on mtime and size too, so a file replaced at the same path is rehashed
+    return f"{BLOBS_URL}/{storage.publish_blob(path).name}"
+
+
+def hashed_url(path: str) -> str:
+    """Content-hashed URL of the file at `path`, publishing it under /blobs"""
+    stat = os.stat(path)
+    return _blob_url(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def derivative_urls(paths: dict) -> dict:
+    return {variant: hashed_url(path) for variant, path in paths.items()}
+
+
+class NegotiatedStaticFiles(StaticFiles):
+    """
+    StaticFiles that answers a request for a .png with its AVIF or WebP
+    derivative when the client's Accept header allows it and the file exists.
+    """
+
+    async def get_response(self, path: str, scope):
+        accept = Headers(scope=scope).get("accept", "")
+        candidates = derivatives.negotiated_paths(path, accept)
+
+        for candidate in candidates[:-1]:
+            try:
+                response = await super().get_response(candidate, scope)
+            except HTTPException:
+                continue
+            if response.status_code < 400:
+                response.headers["Vary"] = "Accept"
+                response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+                return response
+
+        response = await super().get_response(candidates[-1], scope)
+        if path.endswith(".png"):
+            response.headers["Vary"] = "Accept"
+        if response.status_code < 400:
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return response
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for content-addressed blobs. The ETag is the content hash in
+    the file name, so it is strong and the same on every server; range and
+    If-Range requests are handled by FileResponse.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        digest = Path(full_path).name.split(".", 1)[0]
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={
+                "ETag": f'"{digest}"',
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            },
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
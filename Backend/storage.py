@@ -0,0 +1,201 @@
+"""
+Output layout and atomic file writes for generated assets.
+
+Every workflow run writes into its own run directory, and every file is
+written to a temporary name first and moved into place with os.replace, so
+concurrent runs never overwrite each other and readers of the /assets mount
+never see a half-written PNG. When a run finishes, the run directories that
+no manifest or resumable checkpoint refers to any more are deleted.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+import metrics
+
+ASSETS_DIR = Path("assets")
+RUNS_DIRNAME = "runs"
+
+# Content-addressed copies of published files, named by a hash of their bytes
+BLOBS_DIR = ASSETS_DIR / "_blobs_"
+BLOB_HASH_LENGTH = 32
+
+# mkstemp creates files as 0600; published files get the usual 0644 (less
+# the umask) so a proxy or sync job running as another user can read them.
+# Read once here: os.umask can only be read by setting it, which races
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+FILE_MODE = 0o644 & ~_UMASK
+
+# Threads that write finished stages to disk off the generation critical path
+STORAGE_WRITERS = int(os.getenv("STORAGE_WRITERS", "2"))
+
+# Unreferenced run directories touched more recently than this may belong to
+# a run still in progress in another request or process, so they are kept
+RUN_GRACE_SECONDS = float(os.getenv("RUN_GRACE_MINUTES", "60")) * 60
+
+
+def new_run_id() -> str:
+    """Sortable, unique id for one workflow run"""
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def safe_dirname(name: str) -> str:
+    """Make a user-supplied name safe to use as a single path component"""
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    name = name.lstrip(".")
+    return name or "_"
+
+
+def run_dir(parent: str | Path, run_id: str) -> Path:
+    path = Path(parent) / RUNS_DIRNAME / run_id
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def prune_runs(parent: str | Path, keep: set[str]) -> list[str]:
+    """
+    Delete the run directories under `parent` whose id is not in `keep`:
+    superseded and failed runs. Returns the ids removed.
+    """
+    cutoff = time.time() - RUN_GRACE_SECONDS
+    removed = []
+    for path in (Path(parent) / RUNS_DIRNAME).glob("*"):
+        if path.name in keep or not path.is_dir():
+            continue
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path.name)
+    return removed
+
+
+def atomic_write_bytes(path: str | Path, data: bytes) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        os.fchmod(fd, FILE_MODE)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        metrics.BYTES_WRITTEN.inc(len(data))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def image_bytes(img) -> bytes:
+    """
+    Encoded bytes for an image returned by Gemini (google.genai Image, which
+    already holds encoded bytes) or a PIL image (encoded as PNG).
+    """
+    data = getattr(img, "image_bytes", None)
+    if data is not None:
+        return data
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def save_image(img, path: str | Path) -> None:
+    atomic_write_bytes(path, image_bytes(img))
+
+
+def publish(src: str | Path, dest: str | Path) -> None:
+    """Atomically copy `src` to a stable, shared path such as assets/tree/tree_1.png"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+    try:
+        try:
+            os.fchmod(fd, FILE_MODE)
+        finally:
+            os.close(fd)
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def file_digest(path: str | Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def publish_blob(src: str | Path) -> Path:
+    """
+    Content-addressed copy of `src`, e.g. assets/_blobs_/3fa9….png. The same
+    bytes always map to the same name and a name never changes its bytes, so
+    it can be cached forever. Hard-linked when possible, copied otherwise.
+    """
+    src = Path(src)
+    dest = BLOBS_DIR / f"{file_digest(src)[:BLOB_HASH_LENGTH]}{src.suffix}"
+    if dest.exists():
+        return dest
+
+    BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        publish(src, dest)
+    return dest
+
+
+class BackgroundWriter:
+    """
+    Runs disk writes on a small thread pool so a workflow can move on to its
+    next Gemini call while the previous result is still being saved. Writes
+    are grouped (e.g. by run id) so a run can wait for exactly its own.
+    """
+
+    def __init__(self, max_workers: int = STORAGE_WRITERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="writer"
+        )
+        self._pending: dict[str, list[Future]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, group: str, fn, *args, **kwargs) -> Future:
+        future = self._executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._pending.setdefault(group, []).append(future)
+        return future
+
+    def wait(self, group: str) -> list:
+        """
+        Wait for every write of `group` and return their results in submission
+        order. Raises the first failure, after all of them have finished.
+        """
+        with self._lock:
+            futures = self._pending.pop(group, [])
+        errors = [f.exception() for f in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return [f.result() for f in futures]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+writer = BackgroundWriter()
@@ -1,22 +1,68 @@
-import os
+import contextvars
 import sys
 import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from google import genai
-from google.genai import types
-from PIL import Image
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Optional, TypedDict, List
+import asset_cache
+import checkpoints
+import derivatives
+import gemini
+import logs
+import metrics
+import preview
+import profiling
+import progress
+import rate_limit
+import singleflight
+import storage
+import tiling
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+logger = logging.getLogger(__name__)
 
 # ---------------------------------------
 # Gemini setup
 # ---------------------------------------
-load_dotenv()
+LANDSCAPE_MODEL = "gemini-3-pro-image-preview"
+ASPECT_RATIOS = (
+    "1:1",
+    "2:3",
+    "3:2",
+    "3:4",
+    "4:3",
+    "4:5",
+    "5:4",
+    "9:16",
+    "16:9",
+    "21:9",
+)
+RESOLUTIONS = ("1K", "2K", "4K")
+# Defaults when a request doesn't choose
+ASPECT_RATIO = "16:9"
+RESOLUTION = "2K"
+# Progressive mode renders this first, then the requested resolution
+DRAFT_RESOLUTION = "1K"
+# Under landscape_dir: the answer set's one preview, overwritten per render
+PREVIEW_DIRNAME = "preview"
+
+# Checkpoint namespace for this workflow
+WORKFLOW = "landscape"
+
+# Prepended to the composite prompt when re-rendering a draft at a higher
+# resolution, so the upgrade keeps the picture the client has already seen
+UPGRADE_PROMPT = """Re-render the attached landscape at a higher resolution.
+Keep the exact composition, elements, placement, colors, lighting, and art style.
+Only add detail and sharpness; do not add, remove, or move anything.
+
+The original description of the landscape, for reference:
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+"""
 
 
 # ---------------------------------------
@@ -34,7 +80,21 @@ class LandscapeState(TypedDict):
     element_images: list[str]
     final_prompt: str
     final_image_path: str
+    final_derivatives: dict
+    aspect_ratio: str
+    resolution: str
+    # Lower-resolution render to upgrade, empty for a fresh render
+    draft_image_path: str
+    # Long surveys are rendered as side-by-side panels and stitched together
+    tiled: bool
+    tile_prompts: list[str]
+    tile_images: list[str]
     output_dir: str
+    run_id: str
+    cache_key: str
+    # Checkpoint id; a run with the id of an unfinished one resumes it
+    job_id: str
+    cached: bool
     error: str | None
 
 
@@ -129,12 +189,22 @@ The {category} should be immediately recognizable and emotionally expressive.
 # Workflow nodes
 # ---------------------------------------
 def initialize_state(state: LandscapeState) -> LandscapeState:
-    print(
-        f"🌍 Initializing landscape generation from {len(state['survey_answers'])} survey items"
+    logger.info(
+        "Initializing landscape generation from %d survey items",
+        len(state["survey_answers"]),
+        extra={"items": len(state["survey_answers"])},
     )
 
-    output_dir = Path("assets") / "_landscapes_"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    # Every run gets its own directory so concurrent requests for the same
+    # answers never write to the same file
+    state["cache_key"] = landscape_cache_key(
+        state["survey_answers"],
+        state["aspect_ratio"],
+        state["resolution"],
+        state["tiled"],
+    )
+    state["run_id"] = storage.new_run_id()
+    output_dir = storage.run_dir(landscape_dir(state["cache_key"]), state["run_id"])
 
     state["output_dir"] = str(output_dir)
     state["current_index"] = 0
@@ -142,54 +212,122 @@ def initialize_state(state: LandscapeState) -> LandscapeState:
     state["element_images"] = []
     state["final_prompt"] = ""
     state["final_image_path"] = ""
+    state["final_derivatives"] = {}
+    state["tile_prompts"] = []
+    state["tile_images"] = []
+    state["cached"] = False
     state["error"] = None
     return state
 
 
-def generate_element_description(state: LandscapeState) -> LandscapeState:
-    """Generate a detailed description for an individual element based on its survey score"""
-    idx = state["current_index"]
-    item = state["survey_answers"][idx]
-
-    print(
-        f"\n📝 Creating description {idx + 1}/{len(state['survey_answers'])}: {item['category']} (score: {item['score']})"
-    )
-
-    try:
-        prompt = generate_element_prompt(item["category"], item["score"])
-        state["element_prompts"].append(prompt)
-
-        print(
-            f"   Description created for {item['category']} at quality level {item['score']}/5"
+def generate_element_descriptions(
+    state: LandscapeState, config: "Optional[RunnableConfig]" = None
+) -> LandscapeState:
+    """
+    Generate a detailed description for every element based on its survey score.
+    All answers are handled in this one node so the graph costs the same number
+    of supersteps no matter how long the survey is.
+    """
+    total = len(state["survey_answers"])
+
+    # A resumed run already has the descriptions made before it stopped
+    start = len(state["element_prompts"])
+    for idx, item in enumerate(state["survey_answers"][start:], start):
+        logger.debug(
+            "Creating description %d/%d: %s (score: %s)",
+            idx + 1,
+            total,
+            item["category"],
+            item["score"],
         )
-        return state
 
-    except Exception as e:
-        state["error"] = f"Element {idx} ({item['category']}) failed: {e}"
-        print(f"   ❌ {state['error']}")
-        return state
+        try:
+            prompt = generate_element_prompt(item["category"], item["score"])
+            state["element_prompts"].append(prompt)
+            state["current_index"] = idx + 1
+
+            progress.emit(
+                config,
+                phase="elements",
+                element=idx + 1,
+                total_elements=total,
+                category=item["category"],
+            )
 
+        except Exception as e:
+            fail(state, "elements", f"Element {idx} ({item['category']}) failed: {e}")
+            return state
 
-def increment_index(state: LandscapeState) -> LandscapeState:
-    state["current_index"] += 1
     return state
 
 
 def check_elements_complete(state: LandscapeState) -> str:
     if state["error"]:
         return "error"
-    if state["current_index"] >= len(state["survey_answers"]):
-        return "done_with_elements"
-    return "continue"
-
+    return "done_with_elements"
+
+
+# How the prompt describes each image shape
+ORIENTATION_WORDING = {
+    "wide": {
+        "shape": "WIDE HORIZONTAL",
+        "shape_lower": "wide horizontal",
+        "shape_mixed": "WIDE horizontal",
+        "scene": "horizontal",
+        "not": "NOT square, NOT portrait",
+        "proportions": "much wider than it is tall",
+        "strict": "NOT square (1:1) - MUST be landscape orientation",
+        "reminder": "NOT square",
+    },
+    "tall": {
+        "shape": "TALL VERTICAL",
+        "shape_lower": "tall vertical",
+        "shape_mixed": "TALL vertical",
+        "scene": "vertical",
+        "not": "NOT square, NOT horizontal",
+        "proportions": "much taller than it is wide",
+        "strict": "NOT square (1:1) - MUST be portrait orientation",
+        "reminder": "NOT square",
+    },
+    "square": {
+        "shape": "SQUARE",
+        "shape_lower": "square",
+        "shape_mixed": "SQUARE",
+        "scene": "square",
+        "not": "NOT horizontal, NOT portrait",
+        "proportions": "exactly as wide as it is tall",
+        "strict": "NOT wide or tall - MUST be square",
+        "reminder": "NOT wide or tall",
+    },
+}
+
+
+def aspect_wording(aspect_ratio: str) -> dict:
+    """Prompt wording and example pixel sizes for an aspect ratio such as 16:9"""
+    w, h = (int(n) for n in aspect_ratio.split(":"))
+    orientation = "wide" if w > h else "tall" if h > w else "square"
+
+    def dims(long_side: int) -> str:
+        if w >= h:
+            return f"{long_side}x{round(long_side * h / w)}"
+        return f"{round(long_side * w / h)}x{long_side}"
+
+    return {
+        **ORIENTATION_WORDING[orientation],
+        "ratio": aspect_ratio,
+        "dims": dims(1920),
+        "dims_small": dims(1280),
+    }
 
-def create_composite_prompt(state: LandscapeState) -> LandscapeState:
-    """Create the final prompt that combines all elements into one landscape"""
-    print("\n🎭 Creating composite landscape prompt...")
 
+def build_composite_prompt(
+    survey_answers: List[SurveyItem], aspect_ratio: str = ASPECT_RATIO
+) -> str:
+    """Build the prompt that combines all elements into one landscape"""
+    fmt = aspect_wording(aspect_ratio)
     # Build descriptions of each element
     element_descriptions = []
-    for i, item in enumerate(state["survey_answers"]):
+    for i, item in enumerate(survey_answers):
         score = item["score"]
         category = item["category"]
 
@@ -207,19 +345,19 @@ def create_composite_prompt(state: LandscapeState) -> LandscapeState:
 
         element_descriptions.append(desc)
 
-    composite_prompt = f"""CRITICAL: Generate a WIDE HORIZONTAL LANDSCAPE image in 16:9 aspect ratio (NOT square, NOT portrait).
-Dimensions should be approximately 1920x1080 pixels or similar wide horizontal format.
+    composite_prompt = f"""CRITICAL: Generate a {fmt["shape"]} LANDSCAPE image in {fmt["ratio"]} aspect ratio ({fmt["not"]}).
+Dimensions should be approximately {fmt["dims"]} pixels or similar {fmt["shape_lower"]} format.
 
 Create a stunning, emotionally rich landscape illustration incorporating these elements:
 
 {chr(10).join(f"{i + 1}. {desc}" for i, desc in enumerate(element_descriptions))}
 
 LANDSCAPE FORMAT REQUIREMENTS (MUST FOLLOW):
-• WIDE HORIZONTAL format - much wider than it is tall
-• 16:9 aspect ratio (1920x1080 or 1280x720 or similar)
-• NOT square (1:1) - MUST be landscape orientation
+• {fmt["shape"]} format - {fmt["proportions"]}
+• {fmt["ratio"]} aspect ratio ({fmt["dims"]} or {fmt["dims_small"]} or similar)
+• {fmt["strict"]}
 • This is a SINGLE cohesive wide landscape image
-• Each element should be naturally integrated into the horizontal scene
+• Each element should be naturally integrated into the {fmt["scene"]} scene
 
 Visual Style:
 • Flat 2D digital illustration with depth through layering
@@ -244,7 +382,7 @@ Spatial Arrangement:
 • Use foreground, midground, and background to create depth
 • Consider realistic scale and positioning (sky above, ground below, etc.)
 • Elements should feel like they exist in the same world, even if emotionally contradictory
-• Take advantage of the WIDE horizontal format to spread elements across the scene
+• Take advantage of the {fmt["shape_mixed"]} format to spread elements across the scene
 
 Atmospheric Storytelling:
 • The landscape should feel surreal and emotionally complex
@@ -254,108 +392,532 @@ Atmospheric Storytelling:
 • Each element tells its own story within the unified scene
 • The overall effect is dreamlike, haunting, beautiful, and thought-provoking
 
-REMINDER: This MUST be a WIDE HORIZONTAL LANDSCAPE format (16:9), NOT square. Create a masterpiece that embraces emotional complexity and visual contrast while maintaining artistic coherence.
+REMINDER: This MUST be a {fmt["shape"]} LANDSCAPE format ({fmt["ratio"]}), {fmt["reminder"]}. Create a masterpiece that embraces emotional complexity and visual contrast while maintaining artistic coherence.
 """
 
-    state["final_prompt"] = composite_prompt
-    print("✅ Composite prompt created")
+    return composite_prompt
+
+
+# Appended to each panel's composite prompt in tiled mode. Panels are
+# rendered at the same time, so they are tied together by a shared layout
+# and by describing what the neighbouring panels contain.
+TILE_PROMPT = """
+PANORAMA PANEL {index} OF {count} (MUST FOLLOW):
+• This image is panel {index} of {count} side-by-side panels that are joined edge to edge into ONE continuous panorama
+• Shared layout for every panel: horizon at 60% of the image height, a continuous rolling meadow in the foreground, open sky above
+• Shared style for every panel: the same painterly brushwork, the same palette family, and light coming from the upper left
+• {left}
+• {right}
+• Keep the outer {overlap}% at each side free of the listed elements; fill it with continuous ground, sky, and mist so the panels blend seamlessly
+• Include ALL {elements} listed elements in this panel; do not leave any out
+"""
+
+
+def build_tile_prompts(
+    survey_answers: List[SurveyItem], aspect_ratio: str = ASPECT_RATIO
+) -> list[str]:
+    """One composite prompt per panel, left to right"""
+    groups = tiling.split_answers(survey_answers)
+
+    def names(group: List[SurveyItem]) -> str:
+        return ", ".join(item["category"] for item in group)
+
+    prompts = []
+    for i, group in enumerate(groups):
+        if i == 0:
+            left = "The left edge is the far left end of the panorama"
+        else:
+            left = f"The left edge continues the panel showing: {names(groups[i - 1])}"
+        if i == len(groups) - 1:
+            right = "The right edge is the far right end of the panorama"
+        else:
+            right = (
+                f"The right edge leads into the panel showing: {names(groups[i + 1])}"
+            )
+
+        prompts.append(
+            build_composite_prompt(group, aspect_ratio)
+            + TILE_PROMPT.format(
+                index=i + 1,
+                count=len(groups),
+                left=left,
+                right=right,
+                overlap=round(tiling.TILE_OVERLAP * 100),
+                elements=len(group),
+            )
+        )
+    return prompts
+
+
+def use_tiles(survey_answers: List[SurveyItem], tiled: bool | None = None) -> bool:
+    """Whether to tile: as requested, or automatically for long surveys"""
+    if tiled is None:
+        return len(survey_answers) > tiling.TILE_THRESHOLD
+    return tiled
+
+
+def create_composite_prompt(state: LandscapeState) -> LandscapeState:
+    """Create the final prompt that combines all elements into one landscape"""
+
+    if state["tiled"]:
+        state["tile_prompts"] = build_tile_prompts(
+            canonicalize_answers(state["survey_answers"]), state["aspect_ratio"]
+        )
+        state["final_prompt"] = "\n\n".join(state["tile_prompts"])
+        logger.info(
+            "Composite prompts created for %d panels", len(state["tile_prompts"])
+        )
+        return state
+
+    state["final_prompt"] = build_composite_prompt(
+        state["survey_answers"], state["aspect_ratio"]
+    )
+    logger.info("Composite prompt created")
     return state
 
 
-def generate_final_landscape(state: LandscapeState) -> LandscapeState:
+def route_final(state: LandscapeState) -> str:
+    return "tiles" if state["tiled"] else "single"
+
+
+def generate_final_landscape(
+    state: LandscapeState, config: "Optional[RunnableConfig]" = None
+) -> LandscapeState:
     """Generate the final composite landscape using Gemini's aspect ratio config"""
-    print("\n🖼️  Generating final composite landscape...")
-    print("   Using Gemini API with 16:9 aspect ratio configuration")
+    aspect_ratio = state["aspect_ratio"]
+    resolution = state["resolution"]
+    logger.info(
+        "Generating final composite landscape (%s, %s)",
+        aspect_ratio,
+        resolution,
+        extra={"aspect_ratio": aspect_ratio, "resolution": resolution},
+    )
+    progress.emit(config, phase="final", status="generating", resolution=resolution)
 
     try:
-        aspect_ratio = "16:9"  # Options: "1:1","2:3","3:2","3:4","4:3","4:5","5:4","9:16","16:9","21:9"
-        resolution = "2K"  # Options: "1K", "2K", "4K"
+        from google.genai import types
+
+        message = [state["final_prompt"]]
+        if state["draft_image_path"]:
+            logger.info("Upgrading draft %s", state["draft_image_path"])
+            message = [
+                UPGRADE_PROMPT + state["final_prompt"],
+                types.Part.from_bytes(
+                    data=Path(state["draft_image_path"]).read_bytes(),
+                    mime_type="image/png",
+                ),
+            ]
 
-        print(f"   Aspect ratio: {aspect_ratio}, Resolution: {resolution}")
+        img = request_landscape(message, aspect_ratio, resolution)
+        save_final_image(state, img, config)
+        return state
 
-        chat = client.chats.create(
-            model="gemini-3-pro-image-preview",
-            config=types.GenerateContentConfig(
-                response_modalities=["IMAGE"], tools=[{"google_search": {}}]
-            ),
+    except Exception as e:
+        fail(state, "final", f"Final landscape generation failed: {e}")
+        return state
+
+
+def generate_landscape_tiles(
+    state: LandscapeState, config: "Optional[RunnableConfig]" = None
+) -> LandscapeState:
+    """
+    Tiled mode: render every panel at the same time, then stitch them into
+    one panorama locally. A resumed run only renders the missing panels.
+    """
+    prompts = state["tile_prompts"]
+    count = len(prompts)
+    aspect_ratio = state["aspect_ratio"]
+    resolution = state["resolution"]
+    logger.info(
+        "Generating %d landscape panels", count, extra={"resolution": resolution}
+    )
+    progress.emit(
+        config, phase="final", status="generating", resolution=resolution, tiles=count
+    )
+
+    from google.genai import types
+
+    images = state["tile_images"] + [""] * (count - len(state["tile_images"]))
+    todo = [i for i, path in enumerate(images) if not path or not Path(path).is_file()]
+
+    try:
+        # Upgrading a tiled draft: each panel is re-rendered from its own region
+        drafts = []
+        if state["draft_image_path"] and todo:
+            drafts = tiling.crop_panels(state["draft_image_path"], count)
+    except Exception as e:
+        fail(state, "tiles", f"Reading the draft failed: {e}")
+        return state
+
+    def render(i: int) -> str:
+        message = [prompts[i]]
+        if drafts:
+            message = [
+                UPGRADE_PROMPT + prompts[i],
+                types.Part.from_bytes(data=drafts[i], mime_type="image/png"),
+            ]
+        img = request_landscape(message, aspect_ratio, resolution)
+        path = Path(state["output_dir"]) / f"tile_{i + 1}.png"
+        storage.save_image(img, path)
+        metrics.IMAGES_PRODUCED.inc(workflow=WORKFLOW, kind="tile")
+        logger.info("Saved panel %d/%d", i + 1, count, extra={"tile": i + 1})
+        progress.emit(
+            config,
+            phase="tiles",
+            status="saved",
+            tile=i + 1,
+            total_tiles=count,
+            image_path=str(path),
         )
+        return str(path)
+
+    if todo:
+        with ThreadPoolExecutor(
+            max_workers=len(todo), thread_name_prefix="tile"
+        ) as pool:
+            # In copies of the caller's context, like the fan-out stages
+            futures = {
+                i: pool.submit(
+                    contextvars.copy_context().run, profiling.wrap(render), i
+                )
+                for i in todo
+            }
+        for i, future in futures.items():
+            try:
+                images[i] = future.result()
+            except Exception as e:
+                if not state["error"]:
+                    fail(state, "tiles", f"Panel {i + 1} failed: {e}")
+    state["tile_images"] = images
 
-        response = chat.send_message(
-            [state["final_prompt"]],
-            config=types.GenerateContentConfig(
-                image_config=types.ImageConfig(
-                    aspect_ratio=aspect_ratio, image_size=resolution
-                ),
+    if state["error"]:
+        return state
+
+    try:
+        save_final_image(state, tiling.stitch(tiling.open_tiles(images)), config)
+    except Exception as e:
+        fail(state, "stitch", f"Stitching the panorama failed: {e}")
+    return state
+
+
+def request_landscape(message: list, aspect_ratio: str, resolution: str):
+    """One image call to the landscape model; returns the image it sent back"""
+    from google.genai import types
+
+    chat = gemini.get_client().chats.create(
+        model=LANDSCAPE_MODEL,
+        config=types.GenerateContentConfig(
+            response_modalities=["IMAGE"], tools=[{"google_search": {}}]
+        ),
+    )
+
+    response = rate_limit.call(
+        LANDSCAPE_MODEL,
+        chat.send_message,
+        message,
+        config=types.GenerateContentConfig(
+            image_config=types.ImageConfig(
+                aspect_ratio=aspect_ratio, image_size=resolution
             ),
-        )
+        ),
+    )
 
-        output_path = Path(state["output_dir"]) / "final_composite_landscape.png"
+    for part in response.candidates[0].content.parts:
+        if part.inline_data:
+            return part.as_image()
 
-        for part in response.candidates[0].content.parts:
-            if part.inline_data:
-                img = part.as_image()
-                img.save(output_path)
-                state["final_image_path"] = str(output_path)
-                print(f"   ✅ Saved final landscape: {output_path.name}")
-                return state
+    raise RuntimeError("No final image returned")
 
-        raise RuntimeError("No final image returned")
 
+def save_final_image(state: LandscapeState, img, config) -> None:
+    output_path = Path(state["output_dir"]) / "final_composite_landscape.png"
+    storage.save_image(img, output_path)
+    metrics.IMAGES_PRODUCED.inc(workflow=WORKFLOW, kind="landscape")
+    state["final_image_path"] = str(output_path)
+    try:
+        state["final_derivatives"] = derivatives.create_derivatives(output_path)
     except Exception as e:
-        state["error"] = f"Final landscape generation failed: {e}"
-        print(f"   ❌ {state['error']}")
-        return state
+        logger.warning("Could not create derivatives for %s: %s", output_path, e)
+    logger.info("Saved final landscape %s", output_path)
+    progress.emit(
+        config,
+        phase="final",
+        status="saved",
+        image_path=str(output_path),
+        resolution=state["resolution"],
+    )
 
 
 def finalize(state: LandscapeState) -> LandscapeState:
     if state["error"]:
-        print(f"\n❌ Failed: {state['error']}")
+        logger.error("Landscape generation failed: %s", state["error"])
     else:
-        print("\n✨ Landscape generation complete!")
-        print(f"📁 Output directory: {state['output_dir']}")
-        print(f"📝 Processed {len(state['element_prompts'])} element descriptions")
-        print(f"🖼️  Final landscape: {state['final_image_path']}")
+        logger.info(
+            "Landscape generation complete: %s",
+            state["final_image_path"],
+            extra={
+                "run_id": state["run_id"],
+                "elements": len(state["element_prompts"]),
+            },
+        )
+        if not state["cached"]:
+            save_landscape_manifest(state)
+        if state.get("job_id"):
+            checkpoints.store.clear(WORKFLOW, state["job_id"])
+    if not state["cached"]:
+        prune_runs(state)
     return state
 
 
+def fail(state: LandscapeState, stage: str, message: str) -> None:
+    """Mark the run as failed at `stage` (e.g. "final" or "tiles")"""
+    state["error"] = message
+    metrics.FAILURES.inc(workflow=WORKFLOW, stage=stage)
+    logger.error(message, extra={"stage": stage, "run_id": state["run_id"]})
+
+
+def resume_point(state: LandscapeState) -> str:
+    """Entry router: the first node a (possibly resumed) run still has to do"""
+    if not state["run_id"]:
+        return "initialize"
+    if len(state["element_prompts"]) < len(state["survey_answers"]):
+        return "generate_elements"
+    if not state["final_prompt"]:
+        return "create_composite_prompt"
+    if not state["final_image_path"] or not Path(state["final_image_path"]).is_file():
+        return "generate_tiles" if state["tiled"] else "generate_final"
+    return "finalize"
+
+
+# ---------------------------------------
+# Landscape cache
+# ---------------------------------------
+def landscape_dir(cache_key: str) -> Path:
+    return storage.ASSETS_DIR / "_landscapes_" / cache_key[:16]
+
+
+def canonicalize_answers(survey_answers: List[SurveyItem]) -> List[SurveyItem]:
+    """Normalize whitespace in categories and sort answers into a stable order"""
+    canonical = [
+        {
+            "category": " ".join(str(item["category"]).split()),
+            "score": int(item["score"]),
+        }
+        for item in survey_answers
+    ]
+    return sorted(canonical, key=lambda item: (item["category"], item["score"]))
+
+
+def landscape_cache_key(
+    survey_answers: List[SurveyItem],
+    aspect_ratio: str = ASPECT_RATIO,
+    resolution: str = RESOLUTION,
+    tiled: bool = False,
+) -> str:
+    """
+    Cache key covering the canonical answers, the composite prompt they produce
+    (so template edits invalidate it) and the image model settings.
+    """
+    canonical = canonicalize_answers(survey_answers)
+    if tiled:
+        prompt = "\n\n".join(build_tile_prompts(canonical, aspect_ratio))
+    else:
+        prompt = build_composite_prompt(canonical, aspect_ratio)
+    return asset_cache.hash_text(
+        json.dumps(canonical, sort_keys=True),
+        prompt,
+        LANDSCAPE_MODEL,
+        aspect_ratio,
+        resolution,
+        *(["tiled"] if tiled else []),
+    )
+
+
+def save_landscape_manifest(state: LandscapeState) -> None:
+    try:
+        asset_cache.save_manifest(
+            landscape_dir(state["cache_key"]),
+            {
+                "key": state["cache_key"],
+                "run_id": state["run_id"],
+                "output_dir": state["output_dir"],
+                "survey_answers": canonicalize_answers(state["survey_answers"]),
+                "model": LANDSCAPE_MODEL,
+                "aspect_ratio": state["aspect_ratio"],
+                "resolution": state["resolution"],
+                "element_prompts": state["element_prompts"],
+                "final_prompt": state["final_prompt"],
+                "tiled": state["tiled"],
+                "tile_images": state["tile_images"],
+                "final_image_path": state["final_image_path"],
+                "final_derivatives": state["final_derivatives"],
+                "created_at": time.time(),
+            },
+        )
+    except OSError as e:
+        logger.warning("Could not write cache manifest: %s", e)
+
+
+def prune_runs(state: LandscapeState) -> None:
+    """
+    Delete the landscape's run directories that neither its manifest nor a
+    resumable checkpoint refers to any more.
+    """
+    directory = landscape_dir(state["cache_key"])
+    keep = checkpoints.store.run_ids(WORKFLOW)
+    manifest = asset_cache.load_manifest(directory)
+    if manifest:
+        keep.add(manifest.get("run_id", ""))
+    try:
+        removed = storage.prune_runs(directory, keep)
+    except OSError as e:
+        logger.warning("Could not prune landscape runs: %s", e)
+        return
+    if removed:
+        logger.info("Pruned %d old landscape runs", len(removed))
+
+
+def load_cached_landscape(
+    survey_answers: List[SurveyItem],
+    aspect_ratio: str = ASPECT_RATIO,
+    resolution: str = RESOLUTION,
+    tiled: bool | None = None,
+) -> LandscapeState | None:
+    tiled = use_tiles(survey_answers, tiled)
+    key = landscape_cache_key(survey_answers, aspect_ratio, resolution, tiled)
+    manifest = asset_cache.lookup(landscape_dir(key), key, "final_image_path")
+    if manifest is None:
+        return None
+
+    return {
+        "survey_answers": survey_answers,
+        "current_index": len(survey_answers),
+        "element_prompts": manifest["element_prompts"],
+        "element_images": [],
+        "final_prompt": manifest["final_prompt"],
+        "final_image_path": manifest["final_image_path"],
+        "final_derivatives": manifest.get("final_derivatives", {}),
+        "aspect_ratio": aspect_ratio,
+        "resolution": resolution,
+        "draft_image_path": "",
+        "tiled": tiled,
+        "tile_prompts": [],
+        "tile_images": manifest.get("tile_images", []),
+        "output_dir": manifest["output_dir"],
+        "run_id": manifest["run_id"],
+        "cache_key": key,
+        "job_id": "",
+        "cached": True,
+        "error": None,
+    }
+
+
+# ---------------------------------------
+# Local preview
+# ---------------------------------------
+def render_landscape_preview(survey_answers: List[SurveyItem]) -> dict:
+    """
+    Composite a preview from cached stage images (no Gemini call); see
+    preview.render_preview. Each answer set has one preview file, replaced
+    atomically by the next render, so preview traffic doesn't grow the disk.
+    """
+    key = landscape_cache_key(survey_answers)
+    output_dir = landscape_dir(key) / PREVIEW_DIRNAME
+    result = preview.render_preview(survey_answers, output_dir)
+    logger.info(
+        "Preview landscape in %ss, %d element(s) without a cached image",
+        result["seconds"],
+        len(result["missing"]),
+        extra={"seconds": result["seconds"]},
+    )
+    return result
+
+
+def quota_tight() -> bool:
+    """Whether a landscape call would have to queue for the model's budget now"""
+    return rate_limit.limiter_for(LANDSCAPE_MODEL).saturated()
+
+
 # ---------------------------------------
 # Workflow construction
 # ---------------------------------------
 def create_workflow():
+    # langgraph takes most of a second to import, so load it on first use
+    from langgraph.graph import StateGraph, START, END
+
     g = StateGraph(LandscapeState)
 
-    g.add_node("initialize", initialize_state)
-    g.add_node("generate_element", generate_element_description)
-    g.add_node("increment", increment_index)
-    g.add_node("create_composite_prompt", create_composite_prompt)
-    g.add_node("generate_final", generate_final_landscape)
-    g.add_node("finalize", finalize)
+    def node(name, fn, checkpoint=True):
+        if checkpoint:
+            fn = checkpoints.checkpointed(WORKFLOW, name, fn)
+        g.add_node(name, metrics.timed_node(WORKFLOW, name, fn))
 
-    g.set_entry_point("initialize")
-    g.add_edge("initialize", "generate_element")
-    g.add_edge("generate_element", "increment")
+    node("initialize", initialize_state)
+    node("generate_elements", generate_element_descriptions)
+    node("create_composite_prompt", create_composite_prompt)
+    node("generate_final", generate_final_landscape)
+    node("generate_tiles", generate_landscape_tiles)
+    node("finalize", finalize, checkpoint=False)
 
     g.add_conditional_edges(
-        "increment",
+        START,
+        resume_point,
+        {
+            "initialize": "initialize",
+            "generate_elements": "generate_elements",
+            "create_composite_prompt": "create_composite_prompt",
+            "generate_final": "generate_final",
+            "generate_tiles": "generate_tiles",
+            "finalize": "finalize",
+        },
+    )
+    g.add_edge("initialize", "generate_elements")
+
+    g.add_conditional_edges(
+        "generate_elements",
         check_elements_complete,
         {
-            "continue": "generate_element",
             "done_with_elements": "create_composite_prompt",
             "error": "finalize",
         },
     )
 
-    g.add_edge("create_composite_prompt", "generate_final")
+    g.add_conditional_edges(
+        "create_composite_prompt",
+        route_final,
+        {"single": "generate_final", "tiles": "generate_tiles"},
+    )
     g.add_edge("generate_final", "finalize")
+    g.add_edge("generate_tiles", "finalize")
     g.add_edge("finalize", END)
 
     return g.compile()
 
 
+@lru_cache(maxsize=1)
+def get_workflow():
+    """The compiled workflow, built once per process and shared by all requests"""
+    return create_workflow()
+
+
 # ---------------------------------------
 # Entry point
 # ---------------------------------------
-def generate_survey_landscape(survey_answers: List[SurveyItem]):
+# Coalesces identical landscape requests that arrive while one is running
+inflight = singleflight.SingleFlight(WORKFLOW)
+
+
+def generate_survey_landscape(
+    survey_answers: List[SurveyItem],
+    use_cache: bool = True,
+    on_progress: progress.ProgressCallback | None = None,
+    aspect_ratio: str = ASPECT_RATIO,
+    resolution: str = RESOLUTION,
+    draft_image_path: str = "",
+    job_id: str | None = None,
+    resume: bool = True,
+    tiled: bool | None = None,
+):
     """
     Main function to generate a composite landscape from survey answers.
 
@@ -368,23 +930,147 @@ def generate_survey_landscape(survey_answers: List[SurveyItem]):
             {"category": "sky", "score": 5},
             {"category": "tree", "score": 3}
         ]
+
+    Identical answer sets (ignoring order and extra whitespace) are served from
+    the landscape cache unless use_cache is False.
+
+    `draft_image_path` is a lower-resolution render of the same answers to
+    re-render at `resolution` (progressive mode) instead of starting over.
+
+    Progress is checkpointed under `job_id` (by default the cache key, plus
+    the draft when upgrading one); with `resume`, a run with that id that
+    failed or died continues where it stopped, if it started from the same
+    draft. While one is still running, the call starts a separate run.
+
+    Surveys longer than tiling.TILE_THRESHOLD (or any, with `tiled=True`)
+    are rendered as several panels at once and stitched into a panorama.
+
+    Identical calls (same canonical answers and options) made while one is
+    running share its run and result.
     """
-    initial_state: LandscapeState = {
+    if aspect_ratio not in ASPECT_RATIOS:
+        raise ValueError(f"Unknown aspect ratio {aspect_ratio!r}")
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}")
+
+    tiled = use_tiles(survey_answers, tiled)
+    cache_key = landscape_cache_key(survey_answers, aspect_ratio, resolution, tiled)
+
+    def run(report: progress.ProgressCallback) -> LandscapeState:
+        return run_landscape(
+            survey_answers,
+            use_cache,
+            report,
+            aspect_ratio,
+            resolution,
+            draft_image_path,
+            job_id or landscape_job_id(cache_key, draft_image_path),
+            resume,
+            tiled,
+        )
+
+    key = (cache_key, use_cache, draft_image_path, job_id, resume)
+    return inflight.do(key, run, on_progress)
+
+
+def run_landscape(
+    survey_answers: List[SurveyItem],
+    use_cache: bool,
+    on_progress: progress.ProgressCallback | None,
+    aspect_ratio: str,
+    resolution: str,
+    draft_image_path: str,
+    job_id: str,
+    resume: bool,
+    tiled: bool,
+) -> LandscapeState:
+    if use_cache:
+        cached = load_cached_landscape(survey_answers, aspect_ratio, resolution, tiled)
+        metrics.CACHE_LOOKUPS.inc(
+            workflow=WORKFLOW, result="miss" if cached is None else "hit"
+        )
+        if cached is not None:
+            logger.info("Cache hit for landscape: %s", cached["final_image_path"])
+            return cached
+
+    with checkpoints.store.lease(WORKFLOW, job_id) as job_id:
+        state = (
+            resume_landscape(job_id, draft_image_path) if resume and job_id else None
+        )
+        if state is None:
+            state = new_landscape_state(
+                survey_answers, aspect_ratio, resolution, draft_image_path, tiled
+            )
+            state["job_id"] = job_id
+
+        app = get_workflow()
+        return app.invoke(state, config=progress.run_config(on_progress))
+
+
+def landscape_job_id(cache_key: str, draft_image_path: str = "") -> str:
+    """Default job id: upgrading a draft is a different job from a plain render"""
+    if not draft_image_path:
+        return cache_key
+    return asset_cache.hash_text(cache_key, draft_image_path)
+
+
+def resume_landscape(job_id: str, draft_image_path: str) -> LandscapeState | None:
+    """The checkpointed state of job `job_id`, if it upgrades the same draft"""
+    checkpoint = checkpoints.store.load(WORKFLOW, job_id)
+    if checkpoint is None:
+        return None
+
+    state = {**new_landscape_state([]), **checkpoint["state"], "error": None}
+    if state["draft_image_path"] != draft_image_path:
+        logger.warning(
+            "Not resuming job %s: it was started from draft %r, not %r",
+            job_id,
+            state["draft_image_path"],
+            draft_image_path,
+            extra={"job_id": job_id},
+        )
+        return None
+    logger.info(
+        "Resuming landscape at %s (run %s)",
+        resume_point(state),
+        state["run_id"],
+        extra={"job_id": job_id},
+    )
+    return state
+
+
+def new_landscape_state(
+    survey_answers: List[SurveyItem],
+    aspect_ratio: str = ASPECT_RATIO,
+    resolution: str = RESOLUTION,
+    draft_image_path: str = "",
+    tiled: bool = False,
+) -> LandscapeState:
+    return {
         "survey_answers": survey_answers,
         "current_index": 0,
         "element_prompts": [],
         "element_images": [],
         "final_prompt": "",
         "final_image_path": "",
+        "final_derivatives": {},
+        "aspect_ratio": aspect_ratio,
+        "resolution": resolution,
+        "draft_image_path": draft_image_path,
+        "tiled": tiled,
+        "tile_prompts": [],
+        "tile_images": [],
         "output_dir": "",
+        "run_id": "",
+        "cache_key": "",
+        "job_id": "",
+        "cached": False,
         "error": None,
     }
 
-    app = create_workflow()
-    return app.invoke(initial_state)
-
 
 if __name__ == "__main__":
+    logs.setup()
     # Example usage with command line JSON input
     if len(sys.argv) < 2:
         print(
@@ -0,0 +1,42 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Read at import time; AVIF encoding is the slowest part of saving a stage
+os.environ.setdefault("IMAGE_AVIF", "0")
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Assets, checkpoints and profiles go to relative paths; keep them per test"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """
+    The shared Gemini client replaced by the local stand-in, with fresh rate
+    limiters so earlier tests' calls don't count against this one's rpm
+    """
+    import gemini
+    import rate_limit
+    from benchmarks.fake_gemini import FakeGeminiClient
+
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+    client = FakeGeminiClient()
+    gemini.set_client(client)
+    yield client
+    gemini.set_client(None)
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    import rate_limit
+
+    monkeypatch.setattr(rate_limit, "BACKOFF_BASE_SECONDS", 0.001)
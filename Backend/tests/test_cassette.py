@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+
+import cassette
+import gemini
+import main
+
+
+def progression_files(result: dict) -> list[bytes]:
+    return [Path(p).read_bytes() for p in result["image_paths"]]
+
+
+def test_replayed_progression_matches_the_recording(fake_gemini, tmp_path):
+    tape = cassette.Cassette(tmp_path / "cassettes")
+    gemini.set_client(cassette.CassetteClient(fake_gemini, cassette.RECORD, tape))
+    recorded = main.generate_asset_progression("rock", use_cache=False)
+    assert recorded["error"] is None
+    assert len(list(tape.directory.rglob("*.json"))) == fake_gemini.calls
+
+    gemini.set_client(cassette.CassetteClient(None, cassette.REPLAY, tape))
+    replayed = main.generate_asset_progression("rock", use_cache=False)
+
+    assert replayed["error"] is None
+    assert replayed["run_id"] != recorded["run_id"]
+    assert replayed["prompts"] == recorded["prompts"]
+    assert progression_files(replayed) == progression_files(recorded)
+
+
+def test_unrecorded_prompt_is_a_miss(fake_gemini, tmp_path):
+    tape = cassette.Cassette(tmp_path / "cassettes")
+    recorder = cassette.CassetteClient(fake_gemini, cassette.RECORD, tape)
+    recorder.models.generate_content(main.IMAGE_MODEL, "a rock")
+    player = cassette.CassetteClient(None, cassette.REPLAY, tape)
+
+    assert player.models.generate_content(main.IMAGE_MODEL, "a rock")
+    with pytest.raises(cassette.CassetteMiss):
+        player.models.generate_content(main.IMAGE_MODEL, "a tree")
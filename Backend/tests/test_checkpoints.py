@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import checkpoints
+import main
+from benchmarks.fake_gemini import FakeAPIError
+
+
+def fail_nth_call(client, monkeypatch, n: int) -> None:
+    """Make the client's `n`th generate_content call (only) fail for good"""
+    generate = client.models.generate_content
+    count = 0
+    lock = threading.Lock()
+
+    def flaky(*args, **kwargs):
+        nonlocal count
+        with lock:
+            count += 1
+            fail = count == n
+        if fail:
+            raise FakeAPIError(400)
+        return generate(*args, **kwargs)
+
+    monkeypatch.setattr(client.models, "generate_content", flaky)
+
+
+def only_checkpoint() -> dict:
+    (path,) = checkpoints.CHECKPOINTS_DIR.glob(f"{main.WORKFLOW}/*.json")
+    return json.loads(path.read_text())
+
+
+# ---------------------------------------
+# CheckpointStore
+# ---------------------------------------
+def test_save_and_load_leave_out_transient_keys():
+    store = checkpoints.CheckpointStore()
+    store.save("wf", "generate", {"job_id": "job", "stage": 2, "previous_image": b"x"})
+
+    checkpoint = store.load("wf", "job")
+
+    assert checkpoint["node"] == "generate"
+    assert checkpoint["state"] == {"job_id": "job", "stage": 2}
+
+
+def test_expired_checkpoint_is_not_loaded(monkeypatch):
+    store = checkpoints.CheckpointStore()
+    store.save("wf", "generate", {"job_id": "job"})
+    monkeypatch.setattr(checkpoints, "TTL_SECONDS", -1)
+
+    assert store.load("wf", "job") is None
+
+
+def test_cleared_checkpoint_is_gone():
+    store = checkpoints.CheckpointStore()
+    store.save("wf", "generate", {"job_id": "job"})
+    store.clear("wf", "job")
+
+    assert store.load("wf", "job") is None
+
+
+def test_lease_is_exclusive_until_released():
+    store = checkpoints.CheckpointStore()
+
+    with store.lease("wf", "job") as first:
+        with store.lease("wf", "job") as second:
+            assert (first, second) == ("job", "")
+    with store.lease("wf", "job") as third:
+        assert third == "job"
+    assert not store.lease_path("wf", "job").exists()
+
+
+def write_lease(store, pid: int, age: float = 0) -> Path:
+    path = store.lease_path("wf", "job")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"pid": pid, "host": checkpoints.HOST}))
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_lease_of_a_live_process_is_kept():
+    store = checkpoints.CheckpointStore()
+    write_lease(store, os.getppid())
+
+    assert not store.acquire("wf", "job")
+
+
+@pytest.mark.parametrize(
+    "pid, age",
+    [(2**22 + 1, 0), (os.getppid(), checkpoints.LEASE_SECONDS + 60)],
+    ids=["dead process", "no heartbeat"],
+)
+def test_ended_lease_is_taken_over(pid, age):
+    store = checkpoints.CheckpointStore()
+    path = write_lease(store, pid, age)
+
+    assert store.acquire("wf", "job")
+    assert json.loads(path.read_text())["pid"] == os.getpid()
+
+
+def test_save_refreshes_the_lease():
+    store = checkpoints.CheckpointStore()
+    path = write_lease(store, os.getpid(), age=600)
+
+    store.save("wf", "generate", {"job_id": "job"})
+
+    assert time.time() - path.stat().st_mtime < 60
+
+
+# ---------------------------------------
+# Resuming progressions
+# ---------------------------------------
+def test_failed_progression_resumes_at_the_failed_stage(fake_gemini, monkeypatch):
+    fail_nth_call(fake_gemini, monkeypatch, 3)
+    failed = main.generate_asset_progression("rock", use_cache=False)
+    assert failed["error"]
+    assert len(only_checkpoint()["state"]["image_paths"]) == 2
+
+    calls = fake_gemini.calls
+    resumed = main.generate_asset_progression("rock", use_cache=False)
+
+    assert resumed["error"] is None
+    assert resumed["run_id"] == failed["run_id"]
+    assert fake_gemini.calls - calls == 3
+    assert all(Path(p).is_file() for p in resumed["image_paths"])
+    assert not list(checkpoints.CHECKPOINTS_DIR.glob("*/*"))
+
+
+def test_fan_out_keeps_the_stages_that_succeeded(fake_gemini, monkeypatch):
+    fail_nth_call(fake_gemini, monkeypatch, 3)
+    failed = main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+    assert failed["error"]
+    assert sum(1 for p in failed["image_paths"] if p) == 4
+
+    calls = fake_gemini.calls
+    resumed = main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+
+    assert resumed["error"] is None
+    assert resumed["run_id"] == failed["run_id"]
+    assert fake_gemini.calls - calls == 1
+    assert all(Path(p).is_file() for p in resumed["image_paths"])
+
+
+def test_running_job_is_not_taken_over(fake_gemini, monkeypatch):
+    fail_nth_call(fake_gemini, monkeypatch, 2)
+    failed = main.generate_asset_progression("rock", use_cache=False)
+    job_id = only_checkpoint()["job_id"]
+
+    # As if the failed run's retry were still going in another request
+    assert checkpoints.store.acquire(main.WORKFLOW, job_id)
+    try:
+        separate = main.generate_asset_progression("rock", use_cache=False)
+    finally:
+        checkpoints.store.release(main.WORKFLOW, job_id)
+
+    assert separate["error"] is None
+    assert separate["run_id"] != failed["run_id"]
+    assert separate["job_id"] == ""
+    assert only_checkpoint()["state"]["run_id"] == failed["run_id"]
@@ -0,0 +1,99 @@
+import pytest
+
+import checkpoints
+import survey_landscape
+
+SURVEY = [
+    {"category": "tree", "score": 3},
+    {"category": "sky", "score": 5},
+    {"category": "dog", "score": 1},
+]
+
+
+@pytest.fixture
+def image_calls(monkeypatch):
+    """The (message, aspect_ratio, resolution) of every landscape image call"""
+    request = survey_landscape.request_landscape
+    seen = []
+
+    def recording(message, aspect_ratio, resolution):
+        seen.append((message, aspect_ratio, resolution))
+        return request(message, aspect_ratio, resolution)
+
+    monkeypatch.setattr(survey_landscape, "request_landscape", recording)
+    return seen
+
+
+def test_size_options_reach_the_image_call(fake_gemini, image_calls):
+    result = survey_landscape.generate_survey_landscape(
+        SURVEY, aspect_ratio="21:9", resolution="4K"
+    )
+
+    assert result["error"] is None
+    assert [(a, r) for _, a, r in image_calls] == [("21:9", "4K")]
+
+
+@pytest.mark.parametrize(
+    "option", [{"aspect_ratio": "5:4:3"}, {"resolution": "8K"}], ids=str
+)
+def test_unknown_size_options_are_rejected(option):
+    with pytest.raises(ValueError):
+        survey_landscape.generate_survey_landscape(SURVEY, **option)
+
+
+def test_each_resolution_is_cached_on_its_own(fake_gemini, image_calls):
+    for resolution in ("1K", "2K", "1K"):
+        survey_landscape.generate_survey_landscape(SURVEY, resolution=resolution)
+
+    assert [r for _, _, r in image_calls] == ["1K", "2K"]
+
+
+def test_upgrade_re_renders_the_draft(fake_gemini, image_calls):
+    draft = survey_landscape.generate_survey_landscape(
+        SURVEY, resolution=survey_landscape.DRAFT_RESOLUTION
+    )
+
+    final = survey_landscape.generate_survey_landscape(
+        SURVEY, resolution="4K", draft_image_path=draft["final_image_path"]
+    )
+
+    assert final["error"] is None
+    assert final["final_image_path"] != draft["final_image_path"]
+    message, _, resolution = image_calls[-1]
+    assert resolution == "4K"
+    assert message[0].startswith(survey_landscape.UPGRADE_PROMPT)
+    assert message[1].inline_data.mime_type == "image/png"
+
+
+def test_upgrade_does_not_resume_a_plain_run(fake_gemini, image_calls, monkeypatch):
+    draft = survey_landscape.generate_survey_landscape(
+        SURVEY, resolution=survey_landscape.DRAFT_RESOLUTION
+    )
+    # A plain 4K run fails at its image call and leaves a checkpoint behind
+    request = survey_landscape.request_landscape
+
+    def unavailable(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(survey_landscape, "request_landscape", unavailable)
+    failed = survey_landscape.generate_survey_landscape(SURVEY, resolution="4K")
+    assert failed["error"]
+    monkeypatch.setattr(survey_landscape, "request_landscape", request)
+
+    upgrade = survey_landscape.generate_survey_landscape(
+        SURVEY, resolution="4K", draft_image_path=draft["final_image_path"]
+    )
+
+    assert upgrade["error"] is None
+    assert upgrade["run_id"] != failed["run_id"]
+    assert upgrade["draft_image_path"] == draft["final_image_path"]
+    assert image_calls[-1][0][0].startswith(survey_landscape.UPGRADE_PROMPT)
+
+
+def test_checkpoint_of_another_draft_is_not_resumed(fake_gemini):
+    state = survey_landscape.new_landscape_state(SURVEY, draft_image_path="a.png")
+    checkpoints.store.save(survey_landscape.WORKFLOW, "final", {**state, "job_id": "j"})
+
+    assert survey_landscape.resume_landscape("j", "b.png") is None
+    assert survey_landscape.resume_landscape("j", "") is None
+    assert survey_landscape.resume_landscape("j", "a.png") is not None
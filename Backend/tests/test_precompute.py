@@ -0,0 +1,56 @@
+import threading
+
+import main
+import precompute
+import rate_limit
+from demand import DemandTracker
+
+
+def test_budget_is_charged_only_for_the_runs_own_calls(fake_gemini):
+    fake_gemini.latency = 0.01
+    tracker = DemandTracker("demand.json")
+    for thing in ("rock", "tree"):
+        tracker.record(thing)
+    precomputer = precompute.Precomputer(tracker, is_idle=lambda: True)
+
+    # Interactive traffic on the same model while precompute runs
+    stop = threading.Event()
+
+    def interactive():
+        while not stop.is_set():
+            main.generate_asset_progression("moss", use_cache=False)
+
+    visitor = threading.Thread(target=interactive)
+    visitor.start()
+    try:
+        generated = precomputer.run_once(force=True)
+    finally:
+        stop.set()
+        visitor.join()
+
+    assert sorted(generated) == ["rock", "tree"]
+    assert precomputer.status()["calls_today"] == 2 * len(main.STAGE_PROMPTS)
+    assert fake_gemini.calls > 2 * len(main.STAGE_PROMPTS)
+
+
+def test_budget_stops_precompute(fake_gemini):
+    tracker = DemandTracker("demand.json")
+    for thing in ("rock", "tree", "moss"):
+        tracker.record(thing)
+    per_run = len(main.STAGE_PROMPTS) * (1 + main.MAX_REGENERATIONS)
+    precomputer = precompute.Precomputer(
+        tracker, is_idle=lambda: True, daily_calls=per_run + len(main.STAGE_PROMPTS)
+    )
+
+    generated = precomputer.run_once(force=True)
+
+    # The first run settles at 5 calls, leaving room to reserve a second only
+    assert len(generated) == 2
+    assert precomputer.status()["calls_today"] == 2 * len(main.STAGE_PROMPTS)
+
+
+def test_tally_counts_fan_out_stages_in_pool_threads(fake_gemini):
+    with rate_limit.tally() as spent:
+        main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+
+    assert spent.calls == {main.IMAGE_MODEL: len(main.STAGE_PROMPTS)}
@@ -0,0 +1,62 @@
+import main
+
+
+def test_fan_out_renders_stages_two_to_five_at_once(fake_gemini):
+    fake_gemini.latency = 0.1
+
+    result = main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+
+    assert result["error"] is None
+    first, *rest = sorted(fake_gemini.call_log)
+    assert all(start >= first[1] for start, _ in rest)
+    # Every later stage starts before any of them finishes
+    assert max(start for start, _ in rest) < min(end for _, end in rest)
+    assert result["prompts"][1:] == [
+        main.FANOUT_STAGE_PROMPTS[stage].format(thing="rock") for stage in range(2, 6)
+    ]
+
+
+def test_sequential_stages_run_one_after_another(fake_gemini):
+    fake_gemini.latency = 0.02
+
+    result = main.generate_asset_progression("rock", use_cache=False)
+
+    assert result["error"] is None
+    calls = sorted(fake_gemini.call_log)
+    assert len(calls) == 5
+    assert all(nxt[0] >= prev[1] for prev, nxt in zip(calls, calls[1:]))
+
+
+def test_modes_are_cached_separately(fake_gemini):
+    main.generate_asset_progression("rock")
+    main.generate_asset_progression("rock", mode=main.FANOUT)
+    cached = main.generate_asset_progression("rock", mode=main.FANOUT)
+
+    assert cached["cached"]
+    assert cached["mode"] == main.FANOUT
+    assert fake_gemini.calls == 10
+
+
+def test_spellings_of_one_thing_share_its_cache_and_directory(fake_gemini):
+    first = main.generate_asset_progression("  old   tree")
+    second = main.generate_asset_progression("old tree ")
+
+    assert second["cached"]
+    assert second["thing"] == first["thing"] == "old tree"
+    assert fake_gemini.calls == 5
+
+
+def test_names_that_map_to_one_directory_are_one_thing(fake_gemini):
+    first = main.generate_asset_progression("rock/stone")
+    second = main.generate_asset_progression("rock_stone")
+
+    assert second["cached"]
+    assert first["asset_dir"] == second["asset_dir"]
+    assert fake_gemini.calls == 5
+
+
+def test_batch_runs_each_spelling_once(fake_gemini):
+    results = dict(main.generate_asset_progressions(["rock", " rock", "rock  "]))
+
+    assert list(results) == ["rock"]
+    assert fake_gemini.calls == 5
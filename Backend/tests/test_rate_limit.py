@@ -0,0 +1,196 @@
+import asyncio
+import email.utils
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+from benchmarks.fake_gemini import FakeAPIError, FakeGeminiClient
+
+
+def generate(client: FakeGeminiClient, model: str):
+    return rate_limit.call(
+        model, client.models.generate_content, model=model, contents=["prompt"]
+    )
+
+
+def throttled_once(client: FakeGeminiClient, retry_after: str):
+    """generate_content that answers 429 with `retry_after` before succeeding"""
+    calls = []
+
+    def fn(**kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            error = FakeAPIError(429)
+            error.response = SimpleNamespace(headers={"retry-after": retry_after})
+            raise error
+        return client.models.generate_content(**kwargs)
+
+    return fn, calls
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_backoff_doubles_with_jitter_up_to_the_cap(attempt):
+    delay = min(
+        rate_limit.BACKOFF_MAX_SECONDS, rate_limit.BACKOFF_BASE_SECONDS * 2**attempt
+    )
+    for _ in range(20):
+        assert delay / 2 <= rate_limit.backoff_delay(attempt) <= delay
+
+
+def test_transient_errors_are_retried(fast_backoff):
+    client = FakeGeminiClient(error_rate=0.5, seed=1)
+    model = "test-retried"
+
+    for _ in range(5):
+        generate(client, model)
+
+    stats = rate_limit.limiter_for(model).stats()
+    assert client.errors > 0
+    assert stats["retries"] == client.errors
+    assert stats["calls"] == client.calls
+    assert stats["failures"] == 0
+
+
+def test_gives_up_after_max_attempts(fast_backoff):
+    client = FakeGeminiClient(error_rate=1.0)
+    model = "test-exhausted"
+
+    with pytest.raises(FakeAPIError):
+        generate(client, model)
+
+    assert client.calls == rate_limit.MAX_ATTEMPTS
+    stats = rate_limit.limiter_for(model).stats()
+    assert stats["retries"] == rate_limit.MAX_ATTEMPTS - 1
+    assert stats["failures"] == 1
+
+
+def test_final_errors_are_not_retried(fast_backoff):
+    client = FakeGeminiClient()
+    model = "test-final"
+
+    def fn(**kwargs):
+        client.models.generate_content(**kwargs)
+        raise FakeAPIError(400)
+
+    with pytest.raises(FakeAPIError):
+        rate_limit.call(model, fn, model=model, contents=["prompt"])
+
+    assert client.calls == 1
+    assert rate_limit.limiter_for(model).stats()["retries"] == 0
+
+
+def retry_after_header(value: str) -> float | None:
+    error = FakeAPIError(429)
+    error.response = SimpleNamespace(headers={"retry-after": value})
+    return rate_limit.retry_after(error)
+
+
+def test_retry_after_in_seconds():
+    assert retry_after_header("2.5") == 2.5
+
+
+def test_retry_after_as_http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+
+    assert retry_after_header(value) == pytest.approx(30, abs=1.5)
+
+
+def test_retry_after_from_retry_info():
+    error = FakeAPIError(429)
+    error.details = {"error": {"details": [{"retryDelay": "7s"}]}}
+
+    assert rate_limit.retry_after(error) == 7.0
+
+
+def test_retry_after_missing():
+    assert rate_limit.retry_after(FakeAPIError(503)) is None
+
+
+def test_retry_after_pauses_the_model(fast_backoff):
+    client = FakeGeminiClient()
+    model = "test-throttled"
+    fn, calls = throttled_once(client, "0.3")
+
+    rate_limit.call(model, fn, model=model, contents=["prompt"])
+
+    assert calls[1] - calls[0] >= 0.3
+    stats = rate_limit.limiter_for(model).stats()
+    assert stats["throttled"] == 1
+    assert stats["retries"] == 1
+    assert client.calls == 1
+
+
+# ---------------------------------------
+# Async callers
+# ---------------------------------------
+def test_async_callers_wait_on_the_event_loop():
+    limiter = rate_limit.ModelLimiter("test-async", rpm=100, concurrency=1)
+    threads = threading.active_count()
+    seen = []
+
+    async def use():
+        async with limiter.async_slot():
+            seen.append((limiter.in_flight, threading.active_count()))
+            await asyncio.sleep(0.02)
+
+    async def main():
+        await asyncio.gather(*(use() for _ in range(4)))
+
+    asyncio.run(main())
+
+    assert seen == [(1, threads)] * 4
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_release_from_a_thread_wakes_an_async_caller():
+    limiter = rate_limit.ModelLimiter("test-async", rpm=100, concurrency=1)
+    held = threading.Event()
+
+    def hold():
+        with limiter.slot():
+            held.set()
+            time.sleep(0.1)
+
+    async def main():
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        started = time.monotonic()
+        async with limiter.async_slot():
+            waited = time.monotonic() - started
+        thread.join()
+        return waited
+
+    assert 0.05 <= asyncio.run(main()) < 1
+
+
+def test_paused_model_holds_back_async_callers():
+    limiter = rate_limit.ModelLimiter("test-async", rpm=100, concurrency=1)
+    limiter.pause(0.2)
+
+    async def main():
+        started = time.monotonic()
+        async with limiter.async_slot():
+            return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.19
+
+
+def test_cancelled_async_caller_takes_no_slot():
+    limiter = rate_limit.ModelLimiter("test-async", rpm=100, concurrency=1)
+
+    async def main():
+        async with limiter.async_slot():
+            waiter = asyncio.ensure_future(limiter.async_slot().__aenter__())
+            await asyncio.sleep(0.02)
+            assert limiter.stats()["waiting"] == 1
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(main())
+
+    stats = limiter.stats()
+    assert (stats["waiting"], stats["in_flight"], stats["calls"]) == (0, 0, 1)
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+import checkpoints
+import main
+import storage
+import survey_landscape
+from benchmarks.fake_gemini import FakeAPIError
+
+SURVEY = [{"category": "forest", "score": 4}, {"category": "river", "score": 2}]
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    monkeypatch.setattr(storage, "RUN_GRACE_SECONDS", -1)
+
+
+def runs(parent) -> set[str]:
+    return {p.name for p in (parent / storage.RUNS_DIRNAME).iterdir()}
+
+
+def failing(client, monkeypatch) -> None:
+    def fn(*args, **kwargs):
+        raise FakeAPIError(400)
+
+    monkeypatch.setattr(client.models, "generate_content", fn)
+
+
+def test_superseded_runs_are_deleted(fake_gemini, no_grace):
+    for _ in range(3):
+        result = main.generate_asset_progression("rock", use_cache=False)
+
+    assert runs(main.thing_dir("rock")) == {result["run_id"]}
+    assert all(Path(p).is_file() for p in result["image_paths"])
+
+
+def test_runs_of_a_manifest_or_checkpoint_are_kept(fake_gemini, no_grace, monkeypatch):
+    sequential = main.generate_asset_progression("rock", use_cache=False)
+    with monkeypatch.context() as m:
+        failing(fake_gemini, m)
+        failed = main.generate_asset_progression("rock", use_cache=False)
+    assert failed["error"]
+    fanout = main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+
+    assert runs(main.thing_dir("rock")) == {
+        sequential["run_id"],
+        failed["run_id"],
+        fanout["run_id"],
+    }
+
+    # Once the failed run can't be resumed any more its directory goes too
+    monkeypatch.setattr(checkpoints, "TTL_SECONDS", -1)
+    again = main.generate_asset_progression("rock", use_cache=False, mode=main.FANOUT)
+
+    assert runs(main.thing_dir("rock")) == {sequential["run_id"], again["run_id"]}
+
+
+def test_recent_runs_are_kept(fake_gemini):
+    first = main.generate_asset_progression("rock", use_cache=False)
+    second = main.generate_asset_progression("rock", use_cache=False)
+
+    # Possibly still running elsewhere, so not deleted yet
+    assert runs(main.thing_dir("rock")) == {first["run_id"], second["run_id"]}
+
+
+def test_superseded_landscape_runs_are_deleted(fake_gemini, no_grace):
+    for _ in range(2):
+        result = survey_landscape.generate_survey_landscape(SURVEY, use_cache=False)
+
+    directory = Path(result["output_dir"]).parents[1]
+    assert runs(directory) == {result["run_id"]}
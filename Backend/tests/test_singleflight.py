@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from singleflight import SingleFlight
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def start_flight(flights: SingleFlight, fn, callers: int, listeners=None):
+    """Run `callers` calls of one key, all joining before `fn` is let go"""
+    release = threading.Event()
+    listeners = listeners or [None] * callers
+
+    def blocked(report):
+        release.wait()
+        return fn(report)
+
+    pool = ThreadPoolExecutor(max_workers=callers)
+    futures = [pool.submit(flights.do, "key", blocked, listeners[0])]
+    wait_for(lambda: flights.stats()["in_flight"] == 1)
+    futures += [
+        pool.submit(flights.do, "key", blocked, listener) for listener in listeners[1:]
+    ]
+    wait_for(lambda: flights.stats()["coalesced"] == callers - 1)
+    release.set()
+    pool.shutdown(wait=True)
+    return futures
+
+
+def test_waiters_share_the_leaders_result():
+    flights = SingleFlight("test")
+    runs = []
+
+    def fn(report):
+        runs.append(1)
+        return object()
+
+    futures = start_flight(flights, fn, callers=4)
+
+    results = {id(f.result()) for f in futures}
+    assert len(results) == 1
+    assert len(runs) == 1
+    assert flights.stats() == {
+        "calls": 4,
+        "executed": 1,
+        "coalesced": 3,
+        "in_flight": 0,
+    }
+
+
+def test_leaders_error_reaches_every_waiter():
+    flights = SingleFlight("test")
+
+    def fn(report):
+        raise ValueError("boom")
+
+    futures = start_flight(flights, fn, callers=3)
+
+    for future in futures:
+        with pytest.raises(ValueError, match="boom"):
+            future.result()
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_progress_reaches_every_waiter():
+    flights = SingleFlight("test")
+    events = [[], [], []]
+
+    def fn(report):
+        report({"stage": 1})
+        report({"stage": 2})
+
+    start_flight(flights, fn, callers=3, listeners=[e.append for e in events])
+
+    assert events == [[{"stage": 1}, {"stage": 2}]] * 3
+
+
+def test_key_runs_again_once_finished():
+    flights = SingleFlight("test")
+    runs = []
+
+    flights.do("key", lambda report: runs.append(1))
+    flights.do("key", lambda report: runs.append(1))
+
+    assert len(runs) == 2
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_identical_progressions_make_one_set_of_gemini_calls(fake_gemini):
+    fake_gemini.latency = 0.05
+    before = main.inflight.stats()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [
+            pool.submit(main.generate_asset_progression, "rock", use_cache=False)
+            for _ in range(4)
+        ]
+        results = [f.result() for f in futures]
+
+    assert all(r["error"] is None for r in results)
+    assert len({r["run_id"] for r in results}) == 1
+    assert fake_gemini.calls == len(main.STAGE_PROMPTS)
+    after = main.inflight.stats()
+    assert after["executed"] - before["executed"] == 1
+    assert after["coalesced"] - before["coalesced"] == 3
@@ -0,0 +1,96 @@
+from PIL import Image, ImageDraw
+
+import main
+import stage_quality
+
+
+def stage_image(path, light: int, warmth: int = 0) -> str:
+    """A scene whose brightness and warmth are set; the shapes are its structure"""
+    base = (light + warmth, light, max(0, light - warmth))
+    img = Image.new("RGB", (128, 128), base)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((16, 60, 112, 120), fill=tuple(c // 2 for c in base))
+    draw.ellipse((40, 10, 80, 50), fill=tuple(min(255, c + 60) for c in base))
+    img.save(path)
+    return str(path)
+
+
+def metrics(**values) -> list[dict]:
+    """Five stages with every metric at 0.5 and the given overrides, e.g. ssim_3"""
+    stages = [
+        {"stage": i, "luminance": 0.5, "saturation": 0.5, "warmth": 0.5, "ssim": 1.0}
+        for i in range(1, 6)
+    ]
+    for key, value in values.items():
+        name, stage = key.rsplit("_", 1)
+        stages[int(stage) - 1][name] = value
+    return stages
+
+
+def rules(found: list[dict]) -> list[tuple[int, str]]:
+    return [(v["stage"], v["rule"]) for v in found]
+
+
+def test_dips_within_tolerance_pass():
+    tolerance = stage_quality.MONOTONIC_TOLERANCE["luminance"]
+
+    found = stage_quality.violations(metrics(luminance_3=0.5 - tolerance + 0.001))
+
+    assert found == []
+
+
+def test_dips_past_tolerance_fail():
+    tolerance = stage_quality.MONOTONIC_TOLERANCE["warmth"]
+
+    found = stage_quality.violations(metrics(warmth_4=0.5 - tolerance - 0.001))
+
+    assert rules(found) == [(4, "monotonic_warmth")]
+    assert found[0]["limit"] == round(0.5 - tolerance, 4)
+
+
+def test_lost_structure_fails():
+    found = stage_quality.violations(metrics(ssim_2=stage_quality.MIN_SSIM - 0.01))
+
+    assert rules(found) == [(2, "structure")]
+
+
+def test_recovering_progression_is_valid(tmp_path):
+    paths = [
+        stage_image(tmp_path / f"{i}.png", light=40 + 40 * i, warmth=5 * i)
+        for i in range(5)
+    ]
+
+    report = stage_quality.validate(paths)
+
+    assert report["violations"] == []
+    assert report["first_bad_stage"] is None
+    luminance = [m["luminance"] for m in report["metrics"]]
+    assert luminance == sorted(luminance)
+
+
+def test_first_bad_stage_is_reported(tmp_path):
+    lights = [40, 80, 20, 160, 200]
+    paths = [
+        stage_image(tmp_path / f"{i}.png", light=light)
+        for i, light in enumerate(lights)
+    ]
+    # Stage 5 is a different picture altogether
+    Image.effect_noise((128, 128), 80).convert("RGB").save(tmp_path / "4.png")
+
+    report = stage_quality.validate(paths)
+
+    assert report["first_bad_stage"] == 3
+    assert (3, "monotonic_luminance") in rules(report["violations"])
+    assert (5, "structure") in rules(report["violations"])
+
+
+def test_failing_stages_are_regenerated_up_to_the_limit(fake_gemini, monkeypatch):
+    # Every stage after the first now fails the structure check
+    monkeypatch.setattr(stage_quality, "MIN_SSIM", 1.5)
+
+    result = main.generate_asset_progression("rock", use_cache=False)
+
+    assert result["error"] is None
+    assert result["quality"]["regenerations"] == main.MAX_REGENERATIONS
+    assert fake_gemini.calls == 5 + 4 * main.MAX_REGENERATIONS
+    assert {v["rule"] for v in result["quality"]["violations"]} == {"structure"}
@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+
+def test_server_import_leaves_heavy_libraries_for_later():
+    code = "import sys, server; print(sorted({m.split('.')[0] for m in sys.modules}))"
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    for module in ("PIL", "numpy", "langgraph"):
+        assert f"'{module}'" not in loaded
@@ -0,0 +1,120 @@
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+import survey_landscape
+import tiling
+from benchmarks.fake_gemini import FakeAPIError
+
+RED, BLUE, GREEN = (200, 30, 30), (30, 30, 200), (30, 200, 30)
+
+
+def answers(count: int) -> list[dict]:
+    return [{"category": f"element {i}", "score": i % 5 + 1} for i in range(count)]
+
+
+def image_size(client) -> tuple[int, int]:
+    with Image.open(io.BytesIO(client._image)) as img:
+        return img.size
+
+
+@pytest.mark.parametrize("count", [1, 4, 5, 9, 10, 17])
+def test_answers_split_into_even_groups(count):
+    groups = tiling.split_answers(answers(count), per_tile=4)
+
+    sizes = [len(g) for g in groups]
+    assert len(groups) == -(-count // 4)
+    assert max(sizes) <= 4
+    assert max(sizes) - min(sizes) <= 1
+    assert sum(groups, []) == answers(count)
+
+
+def test_stitch_overlaps_panels_by_the_band():
+    tiles = [Image.new("RGB", (100, 50), color) for color in (RED, BLUE, GREEN)]
+
+    panorama = tiling.stitch(tiles, overlap=0.2)
+
+    assert panorama.size == (300 - 2 * 20, 50)
+    # Outside the bands every pixel is its panel's own
+    assert panorama.getpixel((40, 25)) == RED
+    assert panorama.getpixel((120, 25)) == BLUE
+    assert panorama.getpixel((220, 25)) == GREEN
+
+
+def test_seam_cross_fades_from_one_panel_to_the_next():
+    tiles = [Image.new("RGB", (100, 50), color) for color in (RED, BLUE)]
+
+    panorama = tiling.stitch(tiles, overlap=0.2)
+
+    band = [panorama.getpixel((x, 25)) for x in range(80, 100)]
+    reds = [pixel[0] for pixel in band]
+    blues = [pixel[2] for pixel in band]
+    assert reds == sorted(reds, reverse=True)
+    assert blues == sorted(blues)
+    assert band[0] == RED
+    assert band[-1] == BLUE
+
+
+def test_panels_of_another_height_are_scaled_to_the_first():
+    tiles = [Image.new("RGB", (100, 50), RED), Image.new("RGB", (200, 100), BLUE)]
+
+    panorama = tiling.stitch(tiles, overlap=0.2)
+
+    assert panorama.size == (100 + 100 - 20, 50)
+
+
+def test_crop_panels_finds_each_panel_again(tmp_path):
+    colors = (RED, BLUE, GREEN)
+    tiles = [Image.new("RGB", (100, 50), color) for color in colors]
+    path = tmp_path / "panorama.png"
+    tiling.stitch(tiles).save(path)
+
+    crops = tiling.crop_panels(path, len(tiles))
+
+    for data, color in zip(crops, colors):
+        with Image.open(io.BytesIO(data)) as crop:
+            assert crop.size == (100, 50)
+            assert crop.getpixel((50, 25)) == color
+
+
+def test_long_survey_is_rendered_as_a_panorama(fake_gemini):
+    survey = answers(10)
+    panels = len(tiling.split_answers(survey))
+
+    result = survey_landscape.generate_survey_landscape(survey, use_cache=False)
+
+    assert result["error"] is None
+    assert result["tiled"]
+    assert len(result["tile_images"]) == panels
+    with Image.open(result["final_image_path"]) as final:
+        panel_width, height = image_size(fake_gemini)
+        band = int(panel_width * tiling.TILE_OVERLAP)
+        assert final.size == (panels * panel_width - (panels - 1) * band, height)
+
+
+def test_failed_panel_is_the_only_one_rendered_again(fake_gemini, monkeypatch):
+    request = survey_landscape.request_landscape
+    calls = []
+    lock = threading.Lock()
+
+    def second_panel_fails_once(*args, **kwargs):
+        with lock:
+            calls.append(1)
+            fail = len(calls) == 2
+        if fail:
+            raise FakeAPIError(400)
+        return request(*args, **kwargs)
+
+    monkeypatch.setattr(survey_landscape, "request_landscape", second_panel_fails_once)
+    survey = answers(10)
+
+    failed = survey_landscape.generate_survey_landscape(survey, use_cache=False)
+    assert failed["error"]
+    done = fake_gemini.calls
+    resumed = survey_landscape.generate_survey_landscape(survey, use_cache=False)
+
+    assert resumed["error"] is None
+    assert resumed["run_id"] == failed["run_id"]
+    assert fake_gemini.calls - done == 1
@@ -0,0 +1,105 @@
+"""
+Tiled landscapes for long surveys.
+
+One composite prompt stops working past roughly eight elements: it gets
+very long and the model quietly drops some of them. Instead the answers are
+split into a few spatial regions (left to right), every region is rendered
+as its own panel at the same time, and the panels are joined here into one
+wide panorama. Neighbouring panels overlap by TILE_OVERLAP of their width
+and are cross-faded across that band so the seams don't show.
+"""
+
+import io
+import math
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Surveys with more answers than this are tiled
+TILE_THRESHOLD = int(os.getenv("TILE_THRESHOLD", "8"))
+# Most answers drawn in one panel
+TILE_ELEMENTS = int(os.getenv("TILE_ELEMENTS", "4"))
+# Share of a panel's width blended with its neighbour
+TILE_OVERLAP = 0.15
+
+
+def split_answers(answers: list[dict], per_tile: int = TILE_ELEMENTS) -> list[list]:
+    """Consecutive, evenly sized groups of at most `per_tile` answers"""
+    count = max(1, math.ceil(len(answers) / per_tile))
+    bounds = [round(i * len(answers) / count) for i in range(count + 1)]
+    return [answers[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def stitch(tiles: list["Image.Image"], overlap: float = TILE_OVERLAP) -> "Image.Image":
+    """Join panels left to right, cross-fading each overlapping band"""
+    import numpy as np
+    from PIL import Image
+
+    height = tiles[0].height
+    arrays = []
+    for tile in tiles:
+        tile = tile.convert("RGB")
+        if tile.height != height:
+            width = round(tile.width * height / tile.height)
+            tile = tile.resize((width, height), Image.Resampling.LANCZOS)
+        arrays.append(np.asarray(tile, dtype=np.float32))
+
+    band = int(min(a.shape[1] for a in arrays) * overlap)
+    width = sum(a.shape[1] for a in arrays) - band * (len(arrays) - 1)
+    canvas = np.zeros((height, width, 3), dtype=np.float32)
+
+    # Smoothstep weights for the incoming panel across the band
+    t = np.linspace(0.0, 1.0, band, dtype=np.float32)
+    fade = (t * t * (3 - 2 * t))[None, :, None]
+
+    x = 0
+    for i, tile in enumerate(arrays):
+        if i and band:
+            blended = canvas[:, x : x + band] * (1 - fade) + tile[:, :band] * fade
+            canvas[:, x : x + band] = blended
+            canvas[:, x + band : x + tile.shape[1]] = tile[:, band:]
+        else:
+            canvas[:, x : x + tile.shape[1]] = tile
+        x += tile.shape[1] - band
+
+    return Image.fromarray(np.clip(canvas + 0.5, 0, 255).astype(np.uint8), "RGB")
+
+
+def open_tiles(paths: list[str | Path]) -> list["Image.Image"]:
+    from PIL import Image
+
+    tiles = []
+    for path in paths:
+        with Image.open(path) as img:
+            tiles.append(img.convert("RGB"))
+    return tiles
+
+
+def panel_box(
+    size: tuple[int, int], index: int, count: int, overlap: float = TILE_OVERLAP
+) -> tuple[int, int, int, int]:
+    """Where panel `index` of `count` sits in a panorama of `size` made by stitch()"""
+    width, height = size
+    panel = width / (count - (count - 1) * overlap)
+    left = index * panel * (1 - overlap)
+    return round(left), 0, min(width, round(left + panel)), height
+
+
+def crop_panels(path: str | Path, count: int) -> list[bytes]:
+    """
+    PNG bytes of each panel's region of a stitched panorama, e.g. a draft
+    whose panels are re-rendered at a higher resolution.
+    """
+    from PIL import Image
+
+    crops = []
+    with Image.open(path) as panorama:
+        panorama = panorama.convert("RGB")
+    for i in range(count):
+        buf = io.BytesIO()
+        panorama.crop(panel_box(panorama.size, i, count)).save(buf, format="PNG")
+        crops.append(buf.getvalue())
+    return crops